@@ -1,61 +1,160 @@
 class FirstFollowGenerator:
-    def __init__(self, non_terminal, terminal, rules):
+    # rules are lists [lhs, rhs...], a rule with no right hand side is an
+    # empty production. NULLABLE, FIRST and FOLLOW are computed as fixed
+    # points with a worklist and kept in dicts indexed by symbol.
+    # With previous, the generator of an earlier version of the grammar,
+    # NULLABLE and FIRST are only computed again for the nonterminals whose
+    # productions changed and those that can derive them.
+    def __init__(self, non_terminal, terminal, rules, previous = None):
         self.non_terminal = non_terminal
         self.terminal = terminal
         self.rules = rules
+        self.nullable = set()
+        self.first_sets = dict()
+        self.follow_sets = dict()
         self.first = []
         self.follow = []
-        self.generate_first()
+
+        self.nonterminals = list(non_terminal)
+        for rule in rules:
+            if rule[0] not in self.nonterminals:
+                self.nonterminals.append(rule[0])
+        # productions each symbol appears in, to know what to look at again
+        self.used_in = dict()
+        for i, rule in enumerate(rules):
+            for symbol in rule[1:]:
+                self.used_in.setdefault(symbol, []).append(i)
+        self.productions_of = dict()
+        for i, rule in enumerate(rules):
+            self.productions_of.setdefault(rule[0], []).append(i)
+
+        if previous is not None and previous.nonterminals[:1] == self.nonterminals[:1]:
+            affected = self.affected_by(previous)
+            self.nullable = set(previous.nullable) - affected
+            affected = affected & set(self.nonterminals)
+            for symbol in self.nonterminals:
+                if symbol not in affected:
+                    self.first_sets[symbol] = set(previous.first_sets.get(symbol, ()))
+            working_set = [i for symbol in affected for i in self.productions_of.get(symbol, [])]
+            self.generate_nullable(working_set)
+            self.generate_first(affected, working_set)
+        else:
+            self.generate_nullable()
+            self.generate_first()
         self.generate_follow()
 
-    def generate_first(self):
+    def affected_by(self, previous):
+        # nonterminals whose productions differ from those of previous, or
+        # that are new or gone, and every nonterminal with a production
+        # using one
+        changed = set()
+        for symbol in set(self.nonterminals) | set(previous.nonterminals):
+            old = sorted(tuple(previous.rules[i][1:]) for i in previous.productions_of.get(symbol, []))
+            new = sorted(tuple(self.rules[i][1:]) for i in self.productions_of.get(symbol, []))
+            if old != new or (symbol in previous.first_sets) != (symbol in self.nonterminals):
+                changed.add(symbol)
+        affected = set(changed)
+        working_set = list(changed)
+        while len(working_set) > 0:
+            symbol = working_set.pop()
+            for i in self.used_in.get(symbol, []):
+                lhs = self.rules[i][0]
+                if lhs not in affected:
+                    affected.add(lhs)
+                    working_set.append(lhs)
+        return affected
+
+    def generate_nullable(self, working_set = None):
+        if working_set is None:
+            working_set = list(range(len(self.rules)))
+        else:
+            working_set = list(working_set)
+        while len(working_set) > 0:
+            rule = self.rules[working_set.pop()]
+            if rule[0] in self.nullable:
+                continue
+            if all(symbol in self.nullable for symbol in rule[1:]):
+                self.nullable.add(rule[0])
+                working_set.extend(self.used_in.get(rule[0], []))
+
+    def generate_first(self, symbols = None, working_set = None):
+        # only the FIRST sets of symbols are made again from the rules in
+        # working_set, by default all of them
+        if symbols is None:
+            symbols = self.nonterminals
+            working_set = range(len(self.rules))
+        for symbol in symbols:
+            self.first_sets[symbol] = set()
+        working_set = list(working_set)
+        queued = set(working_set)
+        while len(working_set) > 0:
+            i = working_set.pop()
+            queued.discard(i)
+            rule = self.rules[i]
+            first = self.first_sets[rule[0]]
+            size = len(first)
+            first.update(self.get_first_of_string(rule[1:]))
+            if len(first) != size:
+                for j in self.used_in.get(rule[0], []):
+                    if j not in queued:
+                        queued.add(j)
+                        working_set.append(j)
+
         for each_item in self.non_terminal:
-            temp = []
-            temp.append(each_item)
-            explore = each_item
-            for rule in self.rules:
-                if(explore == rule[0]):
-                    if(rule[1] in self.terminal):
-                        temp.append(rule[1])
-                    else:
-                        explore = rule[1]
-            self.first.append(temp)
+            self.first.append([each_item] + sorted(self.first_sets[each_item]))
 
     def generate_follow(self):
-        temp = [self.non_terminal[0], '$']
-        self.follow.append(temp)
-        for each_item in self.non_terminal[1:]:
-            temp = [each_item]
-            for rule in self.rules:
-                for i in range(1, len(rule)):
-                    if (each_item == rule[i]):
-                        if (i < len(rule) - 1):
-                            if (rule[i + 1] in self.terminal):
-                                temp.append(rule[i + 1])
-                            else:
-                                self_first = self.get_first_of(rule[i + 1])
-                                temp = temp + self_first
-                        else:
-                            if (rule[0] != rule[i]):
-                                self_follow = self.get_follow_of(rule[0])
-                                temp = temp + self_follow
-                            else:
-                                continue
-            # Remove duplicates
-            temp = list(dict.fromkeys(temp))
-            self.follow.append(temp)
+        for symbol in self.nonterminals:
+            self.follow_sets[symbol] = set()
+        self.follow_sets[self.nonterminals[0]].add('$')
+
+        # FOLLOW(B) gets FIRST of what comes after B in a rule, and all of
+        # FOLLOW(A) when that can vanish, A being the left hand side
+        flows_to = dict()
+        for rule in self.rules:
+            for i in range(1, len(rule)):
+                symbol = rule[i]
+                if symbol not in self.follow_sets:
+                    continue
+                rest = rule[i + 1:]
+                self.follow_sets[symbol].update(self.get_first_of_string(rest))
+                if self.is_nullable_string(rest) and rule[0] != symbol:
+                    flows_to.setdefault(rule[0], set()).add(symbol)
+
+        working_set = list(self.nonterminals)
+        while len(working_set) > 0:
+            symbol = working_set.pop()
+            for target in flows_to.get(symbol, ()):
+                size = len(self.follow_sets[target])
+                self.follow_sets[target].update(self.follow_sets[symbol])
+                if len(self.follow_sets[target]) != size:
+                    working_set.append(target)
+
+        for each_item in self.non_terminal:
+            self.follow.append([each_item] + sorted(self.follow_sets[each_item]))
+
+    def is_nullable(self, symbol):
+        return symbol in self.nullable
+
+    def is_nullable_string(self, symbols):
+        return all(symbol in self.nullable for symbol in symbols)
+
+    def get_first_of_string(self, symbols):
+        first = set()
+        for symbol in symbols:
+            first.update(self.get_first_of(symbol))
+            if symbol not in self.nullable:
+                break
+        return first
 
     def get_first_of(self, symbol):
-        for each_element in self.first:
-            if (each_element[0] == symbol):
-                return each_element[1:]
-        return []
+        if symbol in self.first_sets:
+            return self.first_sets[symbol]
+        # a terminal starts with itself
+        return {symbol}
 
     def get_follow_of(self, symbol):
-        for each_element in self.follow:
-            if (each_element[0] == symbol):
-                return each_element[1:]
-        return []
+        return self.follow_sets.get(symbol, set())
 
     def get_first(self):
         return self.first
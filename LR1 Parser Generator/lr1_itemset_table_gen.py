@@ -1,182 +1,316 @@
+import os
+import pickle
 from first_follow_generator import FirstFollowGenerator
 
-import copy
-class Item:
-    def __init__(self, rules, id_inp, next, lookahead = '$'):
-        self.rules = rules
-        self.id = id_inp
-        self.end = next
-        self.lookahead = lookahead
-
-    def have_next(self):
-        return (self.end)
+# format of the files written by generateParsingTable(state_file = ...)
+STATE_VERSION = 1
 
-    def getLookahead(self):
-        return self.lookahead
 
-    def have_next(self):
-        return self.end
+# One LR(1) state. Its items are (production, dot, lookahead) tuples, the
+# production being an index into the grammar rules and dot the number of
+# right hand side symbols already read.
+class Item:
+    def __init__(self, id_inp, kernel, items, rules):
+        self.id = id_inp
+        self.kernel = kernel
+        self.items = items
+        self.rules = rules
 
     def getID(self):
         return self.id
 
+    def getKernel(self):
+        return self.kernel
+
+    def getItems(self):
+        return self.items
+
     def getRules(self):
-        return self.rules
+        # items as rule lists with a '.' marker and their lookahead
+        rules = []
+        for production, dot, lookahead in sorted(self.items, key=str):
+            rule = list(self.rules[production])
+            rule.insert(dot + 1, '.')
+            rules.append((rule, lookahead))
+        return rules
 
     def getAll(self):
         print("S " + str(self.id), end = " : ")
-        print("Have_Next = " + str(not self.end), end = " : ")
-        print("Rules = " + str(self.rules), end = " : ")
-        print("LookAhead = " + str(self.lookahead))
+        print("Rules = " + str(self.getRules()))
 
 
+# The LR(1) item sets, built breadth first from the start kernel. reuse
+# maps kernels to the saved closure and goto kernels still valid for this
+# grammar (see saved_states and reusable_states), those are taken as they
+# are instead of being computed.
 class Itemset_LR1:
-    def __init__(self, non_terminal, terminal, rules, ff):
+    def __init__(self, non_terminal, terminal, rules, ff, reuse = None):
         self.non_terminal = non_terminal
         self.terminal = terminal
         self.rules = rules
         self.items = []
-        self.remaining = []
         self.transition = []
-        self.currentNode = []
+        self.state_of = dict()  # kernel -> state id
         self.id = 0
         self.first_follow = ff
+        self.reuse = reuse if reuse is not None else dict()
+        self.reused = 0
+        self.gotos = []  # goto kernels of each state, None until expanded
+
+        # fixed order of the symbols so the state numbers don't depend on
+        # set iteration order
+        self.symbol_order = dict()
+        for symbol in list(non_terminal) + list(terminal) + ['$']:
+            self.symbol_order.setdefault(symbol, len(self.symbol_order))
+        for rule in rules:
+            for symbol in rule:
+                self.symbol_order.setdefault(symbol, len(self.symbol_order))
+
+        self.productions_of = dict()
+        for i, rule in enumerate(rules):
+            self.productions_of.setdefault(rule[0], []).append(i)
+        self.init_first_of_suffix()
+
         self.init_states()
         self.expand_All_Items()
 
-
-    def createItem(self, rule, next, lookahead):
-        temp_item = Item(rule, self.id, next, lookahead)
-        self.remaining.append(temp_item)
+    def init_first_of_suffix(self):
+        # suffix_first[p][dot] = FIRST of rhs[dot+1:] of production p,
+        # suffix_nullable[p][dot] whether those symbols can all vanish;
+        # the lookaheads of the items a closure adds for rhs[dot]
+        self.suffix_first = []
+        self.suffix_nullable = []
+        for rule in self.rules:
+            rhs = rule[1:]
+            firsts = [frozenset()] * (len(rhs) + 1)
+            nullables = [True] * (len(rhs) + 1)
+            first = set()
+            nullable = True
+            for dot in range(len(rhs) - 1, -1, -1):
+                firsts[dot] = frozenset(first)
+                nullables[dot] = nullable
+                if self.first_follow.is_nullable(rhs[dot]):
+                    first = first | self.first_follow.get_first_of(rhs[dot])
+                else:
+                    first = set(self.first_follow.get_first_of(rhs[dot]))
+                    nullable = False
+            self.suffix_first.append(firsts)
+            self.suffix_nullable.append(nullables)
+
+    def closure(self, kernel):
+        items = set(kernel)
+        working_set = list(kernel)
+        while len(working_set) > 0:
+            production, dot, lookahead = working_set.pop()
+            rule = self.rules[production]
+            if dot + 1 >= len(rule):
+                continue
+            symbol = rule[dot + 1]
+            if symbol not in self.productions_of:
+                continue
+            lookaheads = self.suffix_first[production][dot]
+            if self.suffix_nullable[production][dot]:
+                lookaheads = lookaheads | {lookahead}
+            for next_production in self.productions_of[symbol]:
+                for next_lookahead in lookaheads:
+                    item = (next_production, 0, next_lookahead)
+                    if item not in items:
+                        items.add(item)
+                        working_set.append(item)
+        return frozenset(items)
+
+    def goto_kernels(self, items):
+        # symbol -> kernel reached by reading it, symbols in symbol_order
+        kernels = dict()
+        for production, dot, lookahead in items:
+            rule = self.rules[production]
+            if dot + 1 < len(rule):
+                kernels.setdefault(rule[dot + 1], set()).add((production, dot + 1, lookahead))
+        return sorted(((symbol, frozenset(kernel)) for symbol, kernel in kernels.items()),
+                      key=lambda pair: self.symbol_order[pair[0]])
+
+    def createItem(self, kernel):
+        self.state_of[kernel] = self.id
+        if kernel in self.reuse:
+            cores, gotos = self.reuse[kernel][:2]
+            closure = frozenset((production, dot, lookahead) for (production, dot), lookaheads in cores
+                                for lookahead in lookaheads)
+            gotos = sorted(gotos, key=lambda pair: self.symbol_order[pair[0]])
+            self.reused += 1
+        else:
+            closure, gotos = self.closure(kernel), None
+        self.items.append(Item(self.id, kernel, closure, self.rules))
+        self.gotos.append(gotos)
         self.id = self.id + 1
-       # print(rule)
 
     def init_states(self):
-        temp_deep = copy.deepcopy(self.rules)
-        temp = [temp_deep[0]]
-        temp[0].insert(1, '.')
-        start = temp[0]
-        lookahead = temp[0][2]
-        #print(lookahead)
-        for i in range(0,len(start)):
-            if(start[i] == '.'):
-                if(start[i+1] in self.non_terminal):
-                    expand = start[i+1]
-                    for rule in self.rules:
-                        temp_expand = []
-                        if (expand == rule[0]):
-                            for j in range(len(rule)):
-                                if (j == 1):
-                                    temp_expand.append('.')
-                                    if (rule[j] in self.non_terminal):
-                                        expand = rule[j]
-                                temp_expand.append(rule[j])
-                            temp.append(temp_expand)
-
-        first_of_lookahead = self.first_follow.get_first_of(lookahead)
-        self.createItem(temp, False, first_of_lookahead)
+        self.createItem(frozenset([(0, 0, '$')]))
 
     def expand_All_Items(self):
-        #print(len(self.remaining))
-        #i = 0
-        while(len(self.remaining) != 0):
-            #for item in self.items:
-                #item.getAll()
-                #pass
-            currentNode = self.remaining.pop(0)
-            currentNodeX = copy.deepcopy(currentNode)
-            self.currentNode = copy.deepcopy(currentNode)
-            if(currentNode.have_next()):
-                self.items.append(currentNode)
-            else:
-                if(self.expand(currentNodeX)):
-                    self.items.append(currentNode)
-            #if(i == 2):
-                #break
-            #i += 1
-            #currentNode.getAll()
+        # states are made in breadth first order, each kernel once
+        current = 0
+        while current < len(self.items):
+            self.expand(self.items[current])
+            current += 1
+
     def expand(self, node):
-        nodeID = node.getID()
-        nodeRules = node.getRules()
-
-        for rule in nodeRules:
-            temp_transition = ''
-            temp = []
-            dot_moved = False
-            haveNext = False
-            for i in range(len(rule)):
-                if(rule[i] == '.'):
-                    if(i < len(rule)-1):
-                        if(dot_moved == False):
-                            rule[i],rule[i+1] = rule[i+1], rule[i]
-                            temp.append(rule)
-                            dot_moved = True
-                        if(i+1 == len(rule)-1 and rule[i+1] == '.'):
-                            haveNext = True
-                        next_transition = self.id
-
-            for j in range(len(rule)):
-                # get transition input
-                if (rule[j] == '.'):
-                    temp_transition = rule[j - 1]
-
-                if (rule[j]== '.' and j != len(rule) - 1):
-                    if (rule[j + 1] in self.non_terminal):
-                        for rule2 in self.rules:
-                            if (rule[j + 1] == rule2[0]):
-                                temp_item = []
-                                for k in range(len(rule2)):
-                                    if (k == 1):
-                                        temp_item.append('.')
-                                    temp_item.append(rule2[k])
-                                temp.append(temp_item)
-
-            explored_exist = self.checkExists(self.items, temp)
-            unexplored_exist = self.checkExists(self.remaining, temp)
-            #print(self.currentNode)
-            #print(node)
-            itself = self.checkExists([self.currentNode], temp)
-            #print(explored_exist)
-            #print(unexplored_exist)
-            #print(itself)
-
-            if (explored_exist[0] == False and unexplored_exist[0] == False and itself[0] == False):
-                self.createItem(temp, haveNext, self.currentNode.getLookahead())
+        if self.gotos[node.getID()] is None:
+            self.gotos[node.getID()] = self.goto_kernels(node.getItems())
+        for symbol, kernel in self.gotos[node.getID()]:
+            if kernel not in self.state_of:
+                self.createItem(kernel)
+            self.transition.append([node.getID(), symbol, self.state_of[kernel]])
+        return True
+
+    # (kernel, cores, gotos, symbols, productions) of every state, by state
+    # id, kept for the next run. The closure is saved as its cores, each
+    # (production, dot) with the set of its lookaheads, which is much
+    # smaller to store, and the gotos as (symbol, state id). symbols are
+    # those the closure and the gotos depend on (see reusable_states),
+    # productions those in the items.
+    def saved_states(self):
+        gotos = [[] for item in self.items]
+        for from_state, symbol, to_state in self.transition:
+            gotos[from_state].append((symbol, to_state))
+        states = []
+        for item in self.items:
+            kernel = item.getKernel()
+            if kernel in self.reuse:
+                cores, symbols, productions = self.reuse[kernel][0], self.reuse[kernel][2], self.reuse[kernel][3]
             else:
-                if (explored_exist[1] != -1):
-                    next_transition = explored_exist[1]
-                elif (unexplored_exist[1] != -1):
-                    next_transition = unexplored_exist[1]
-                elif (itself[1] != -1):
-                    next_transition = itself[1]
+                cores = dict()
+                for production, dot, lookahead in item.getItems():
+                    cores.setdefault((production, dot), set()).add(lookahead)
+                symbols = set()
+                for production, dot in cores:
+                    symbols.update(self.rules[production][dot + 1:])
+                symbols = frozenset(symbols)
+                productions = frozenset(production for production, dot in cores)
+                cores = tuple((core, frozenset(lookaheads)) for core, lookaheads in cores.items())
+            states.append((kernel, cores, gotos[item.getID()], symbols, productions))
+        return states
 
-            #print("NT:",next_transition)
-            self.transition.append([nodeID, temp_transition, next_transition])
+    def getRules(self):
+        return self.rules
 
-        return True
+    def getID(self):
+        return self.id
 
-    def checkExists(self, input_rules, temp_rule):
-        next_transition = -1
-        temp = False
-        for rules in input_rules:
-            rule = rules.getRules()
-            lookahead = rules.getLookahead()
-            for i in range(len(rule)):
-                if (len(rule) != len(temp_rule)):
-                    continue
-                is_same = True
-
-                for j in range(len(rule[i])):
-                    if (len(rule[i]) != len(temp_rule[i]) or rule[i][j] != temp_rule[i][j]):
-                        is_same = False
-                        break
-
-                if (is_same == True):
-                    next_transition = rules.getID()
-                    temp = True
-                else:
-                    break
-        return (temp, next_transition)
+    def getItems(self):
+        return self.items
+
+    def getTransitions(self):
+        return self.transition
+
+    def viewItems(self):
+        for item in self.items:
+            item.getAll()
+
+    def viewTransitions(self):
+        for transition in self.transition:
+            print(transition)
+
+# The saved states of an earlier version of the grammar (old_rules, old_ff)
+# that are still right for rules and ff, with their productions renumbered.
+# A closure only reads the productions of the symbols after the dot of its
+# items and the FIRST and NULLABLE of those symbols. If none of them changed
+# and no production of its items is gone, the closure and its gotos are the
+# same. Productions are matched by content, the n-th copy of a rule to the
+# n-th copy.
+def reusable_states(saved, old_rules, old_ff, rules, ff):
+    def numbered(rule_list):
+        count = dict()
+        keys = []
+        for rule in rule_list:
+            key = (rule[0], tuple(rule[1:]))
+            count[key] = count.get(key, 0) + 1
+            keys.append(key + (count[key],))
+        return keys
+
+    new_index = {key: i for i, key in enumerate(numbered(rules))}
+    renumber = dict()
+    for i, key in enumerate(numbered(old_rules)):
+        if key in new_index:
+            renumber[i] = new_index[key]
+
+    def productions_of(rule_list):
+        productions = dict()
+        for rule in rule_list:
+            productions.setdefault(rule[0], []).append(tuple(rule[1:]))
+        return {symbol: sorted(rhs) for symbol, rhs in productions.items()}
+
+    old_productions = productions_of(old_rules)
+    new_productions = productions_of(rules)
+    symbols = set(old_productions) | set(new_productions) | set(ff.first_sets) | set(old_ff.first_sets)
+    dirty = set()
+    for symbol in symbols:
+        if (old_productions.get(symbol) != new_productions.get(symbol)
+                or old_ff.get_first_of(symbol) != ff.get_first_of(symbol)
+                or old_ff.is_nullable(symbol) != ff.is_nullable(symbol)):
+            dirty.add(symbol)
+    moved = set(i for i in range(len(old_rules)) if renumber.get(i) != i)
+
+    kernels = dict()  # state id -> its kernel renumbered
+
+    def kernel_of(state):
+        if state not in kernels:
+            kernel = saved[state][0]
+            if not moved.isdisjoint(production for production, dot, lookahead in kernel):
+                kernel = frozenset((renumber[production], dot, lookahead) for production, dot, lookahead in kernel)
+            kernels[state] = kernel
+        return kernels[state]
+
+    reuse = dict()
+    for state, (kernel, cores, gotos, depends_on, productions) in enumerate(saved):
+        if not dirty.isdisjoint(depends_on):
+            continue
+        if not moved.isdisjoint(productions):
+            if not all(production in renumber for production in productions):
+                continue
+            cores = tuple(((renumber[production], dot), lookaheads) for (production, dot), lookaheads in cores)
+            productions = frozenset(renumber[production] for production in productions)
+        # the goto kernels are made of the items of this state, so they
+        # can be renumbered too
+        gotos = [(symbol, kernel_of(to_state)) for symbol, to_state in gotos]
+        reuse[kernel_of(state)] = (cores, gotos, depends_on, productions)
+    return reuse
+
+# LALR(1) states: the LR(1) states with the same core (items without their
+# lookaheads) merged into one, numbered in order of their first LR(1) state.
+class Itemset_LALR1:
+    def __init__(self, lr1):
+        self.rules = lr1.getRules()
+        self.lr1 = lr1
+        self.items = []
+        self.transition = []
+        self.merged = dict()  # LR(1) state id -> LALR(1) state id
+        self.merge_cores()
+        self.id = len(self.items)
+
+    def merge_cores(self):
+        state_of_core = dict()
+        kernels = []
+        items = []
+        for lr1_item in self.lr1.getItems():
+            core = frozenset((production, dot) for production, dot, lookahead in lr1_item.getItems())
+            if core not in state_of_core:
+                state_of_core[core] = len(kernels)
+                kernels.append(set())
+                items.append(set())
+            state = state_of_core[core]
+            self.merged[lr1_item.getID()] = state
+            kernels[state].update(lr1_item.getKernel())
+            items[state].update(lr1_item.getItems())
+
+        for state in range(len(kernels)):
+            self.items.append(Item(state, frozenset(kernels[state]), frozenset(items[state]), self.rules))
+
+        seen = set()
+        for from_state, symbol, to_state in self.lr1.getTransitions():
+            transition = (self.merged[from_state], symbol, self.merged[to_state])
+            if transition not in seen:
+                seen.add(transition)
+                self.transition.append(list(transition))
 
     def getRules(self):
         return self.rules
@@ -198,8 +332,30 @@ class Itemset_LR1:
         for transition in self.transition:
             print(transition)
 
+def reduce_reduce_conflicts(items, rules):
+    # (state, lookahead, productions) for every lookahead that more than one
+    # completed item of a state reduces on
+    conflicts = []
+    for each_item in items:
+        reductions = dict()
+        for production, dot, lookahead in each_item.getItems():
+            if dot + 1 == len(rules[production]):
+                reductions.setdefault(lookahead, set()).add(production)
+        for lookahead, productions in reductions.items():
+            if len(productions) > 1:
+                conflicts.append((each_item.getID(), lookahead, frozenset(productions)))
+    return conflicts
+
+def rule_name(rule):
+    return rule[0] + ' -> ' + ' '.join(rule[1:])
+
+# precedence maps terminals (and names only used with %prec) to
+# (level, associativity), higher levels binding tighter, associativity
+# being 'left', 'right' or 'nonassoc'. rule_precedence holds the %prec
+# symbol of each rule or None, the rule then takes the precedence of the
+# last terminal of its right hand side.
 class ParsingTable:
-    def __init__(self, nonterm, term, items, rules, transition, id, ff):
+    def __init__(self, nonterm, term, items, rules, transition, id, ff, precedence = None, rule_precedence = None):
         self.non_terminal = nonterm
         self.terminal = term
         self.rules = rules
@@ -207,11 +363,27 @@ class ParsingTable:
         self.num = id-1
         self.first_follow = ff
         self.items = items
+        self.precedence = precedence if precedence is not None else dict()
+
+        lhs_symbols = set(nonterm) | set(rule[0] for rule in rules)
+        self.rule_levels = []
+        for i, rule in enumerate(rules):
+            symbol = None
+            if rule_precedence is not None and i < len(rule_precedence):
+                symbol = rule_precedence[i]
+            if symbol is None:
+                terminals = [s for s in rule[1:] if s not in lhs_symbols]
+                if len(terminals) > 0:
+                    symbol = terminals[-1]
+            level = self.precedence.get(symbol)
+            self.rule_levels.append(None if level is None else level[0])
+        self.conflicts = []
+        self.resolved = 0
 
     def generate_table(self):
-        self.terminal.append('$')
-        table_rules = [None] * (self.num+1)
-        #print(table_rules)
+        if '$' not in self.terminal:
+            self.terminal.append('$')
+        table_rules = [dict() for i in range(self.num+1)]
         ##SHIFT
         #add accept rule
         self.transition.append([0,self.rules[0][0], 'accept'])
@@ -219,53 +391,222 @@ class ParsingTable:
             id = each_transition[0]
             key = each_transition[1]
             to = each_transition[2]
-            if(table_rules[id] == None):
-                if(key in self.non_terminal):
-                    table_rules[id] = [[key, ('', to)]]
-                else:
-                    table_rules[id] = [[key, ('s', to)]]
+            if (key in self.non_terminal):
+                table_rules[id][key] = ('', to)
             else:
-                if (key in self.non_terminal):
-                    table_rules[id].append([key, ('', to)])
-                else:
-                    table_rules[id].append([key, ('s', to)])
+                table_rules[id][key] = ('s', to)
 
-        #REDUCE
+        #REDUCE on the lookahead of every completed item
+        lengths = [len(rule) for rule in self.rules]
         for each_item in self.items:
-            if(not each_item.have_next() == False):
-                item_id = each_item.getID()
-                #print(item_id)
-                item_rules = each_item.getRules()[0]
-                item_follow = self.first_follow.get_follow_of(item_rules[0])
-                for each_item in item_follow:
-                    if (table_rules[item_id] == None):
-                        table_rules[item_id] = [[each_item, ('r', (item_rules[0], tuple(item_rules[1:-1])))]]
-                    else:
-                        table_rules[item_id].append([each_item, ('r', (item_rules[0], tuple(item_rules[1:-1])))])
+            item_id = each_item.getID()
+            reductions = dict()
+            for production, dot, lookahead in each_item.getItems():
+                if dot + 1 == lengths[production]:
+                    reductions.setdefault(lookahead, []).append(production)
+            for lookahead in sorted(reductions):
+                row = table_rules[item_id]
+                row[lookahead] = self.resolve(item_id, lookahead, row.get(lookahead), sorted(reductions[lookahead]))
 
         #Create table dict
         dicts = {}
         keys = range(self.num+1)
         for i in keys:
-            dicts[i] = dict(table_rules[i])
+            dicts[i] = table_rules[i]
         print(dicts)
+        self.table = dicts
+        self.report_conflicts()
 
         return str(dicts)
 
+    # The entry for lookahead in state when productions (in grammar order)
+    # can be reduced there and shift is the shift entry or None, as yacc
+    # does it. Of several productions the first one is reduced by. Against
+    # a shift, the reduction wins if its production has the higher
+    # precedence and the shift if the lookahead has; on a tie %left reduces,
+    # %right shifts and %nonassoc makes the entry an error ('e'). When
+    # either has no precedence the shift is taken. Conflicts that
+    # precedence didn't settle are kept in self.conflicts as (state,
+    # lookahead, shift entry or None, productions).
+    def resolve(self, state, lookahead, shift, productions):
+        production = productions[0]
+        if len(productions) > 1:
+            self.conflicts.append((state, lookahead, None, productions))
+        rule = self.rules[production]
+        reduce = ('r', (rule[0], tuple(rule[1:])))
+        if shift is None:
+            return reduce
+        rule_level = self.rule_levels[production]
+        token = self.precedence.get(lookahead)
+        if rule_level is None or token is None:
+            self.conflicts.append((state, lookahead, shift, [production]))
+            return shift
+        self.resolved += 1
+        level, associativity = token
+        if rule_level > level or (rule_level == level and associativity == 'left'):
+            return reduce
+        if rule_level < level or associativity == 'right':
+            return shift
+        return ('e', None)
+
+    def report_conflicts(self):
+        shift_reduce = 0
+        for state, lookahead, shift, productions in self.conflicts:
+            rules = ', '.join(rule_name(self.rules[production]) for production in productions)
+            if shift is not None:
+                shift_reduce += 1
+                print("Shift/reduce conflict in state " + str(state) + " on " + lookahead + ": shift to "
+                      + str(shift[1]) + " or reduce by " + rules + ", shifting")
+            else:
+                print("Reduce/reduce conflict in state " + str(state) + " on " + lookahead + ": " + rules
+                      + ", reducing by " + rule_name(self.rules[productions[0]]))
+        if self.resolved > 0:
+            print("Conflicts resolved by precedence: " + str(self.resolved))
+        if len(self.conflicts) > 0:
+            print(str(shift_reduce) + " shift/reduce and " + str(len(self.conflicts) - shift_reduce)
+                  + " reduce/reduce conflicts")
+
+    # Integer form of the table for the generated parser. Symbols are
+    # numbered terminals first ('$' included), then nonterminals. An entry
+    # is s + 1 to shift (or go) to state s, -(p + 1) to reduce by
+    # production p, 0 for an error; reducing by production 0 accepts. A
+    # state whose reductions all use one production reduces by it on any
+    # other symbol (default[state]) and those entries are left out, an
+    # error entry made by %nonassoc is then kept as an explicit 0. The rows
+    # are then packed into one array by row displacement: the entry of
+    # (state, symbol) is value[base[state] + symbol] if check[] at that
+    # index is state, otherwise default[state].
+    def compress(self):
+        symbols = [t for t in self.terminal if t not in self.non_terminal]
+        for rule in self.rules:
+            for symbol in rule[1:]:
+                if symbol not in self.non_terminal and symbol not in symbols:
+                    symbols.append(symbol)
+        if '$' not in symbols:
+            symbols.append('$')
+        symbols = symbols + [n for n in self.non_terminal]
+        for rule in self.rules:
+            if rule[0] not in symbols:
+                symbols.append(rule[0])
+        symbol_id = {symbol: i for i, symbol in enumerate(symbols)}
+        production_id = dict()
+        for i, rule in enumerate(self.rules):
+            production_id.setdefault((rule[0], tuple(rule[1:])), i)
+
+        rows = []
+        default = []
+        for state in range(self.num+1):
+            row = dict()
+            for key, (action, to) in self.table[state].items():
+                if action == 'r':
+                    row[symbol_id[key]] = -(production_id[to] + 1)
+                elif action == 'e':
+                    row[symbol_id[key]] = 0
+                elif to != 'accept':
+                    row[symbol_id[key]] = to + 1
+            reductions = set(entry for entry in row.values() if entry < 0)
+            if len(reductions) == 1 and -1 not in reductions:
+                reduction = reductions.pop()
+                row = {symbol: entry for symbol, entry in row.items() if entry != reduction}
+                default.append(reduction)
+            else:
+                row = {symbol: entry for symbol, entry in row.items() if entry != 0}
+                default.append(0)
+            rows.append(row)
+
+        # first fit, fullest rows first. The used places of check are the
+        # bits of used, a row fits at offset if its bits shifted there miss
+        # them all.
+        base = [0] * len(rows)
+        check = []
+        value = []
+        used = 0
+        for state in sorted(range(len(rows)), key=lambda state: -len(rows[state])):
+            row = rows[state]
+            if len(row) == 0:
+                continue
+            first_free = (~used & (used + 1)).bit_length() - 1
+            offset = max(0, first_free - min(row))
+            row_bits = 0
+            for symbol in row:
+                row_bits |= 1 << symbol
+            while (row_bits << offset) & used:
+                offset += 1
+            base[state] = offset
+            used |= row_bits << offset
+            for symbol, entry in row.items():
+                while len(check) <= offset + symbol:
+                    check.append(-1)
+                    value.append(0)
+                check[offset + symbol] = state
+                value[offset + symbol] = entry
+        # every base[state] + symbol must be a valid index
+        while len(check) < max(base) + len(symbols):
+            check.append(-1)
+            value.append(0)
+
+        productions = [(rule[0], tuple(rule[1:])) for rule in self.rules]
+        print("Table entries: " + str(sum(len(row) for row in self.table.values()))
+              + " -> packed into " + str(len(value)))
+
+        return [symbols, productions, tuple(base), tuple(check), tuple(value), tuple(default)]
+
 class MainLR1gen:
     def __init__(self):
         pass
-    def generateParsingTable(self, non_terminal, terminal, rules):
-        ff = FirstFollowGenerator(non_terminal, terminal, rules)
+
+    # With state_file the grammar, its FIRST/FOLLOW and the item sets are
+    # saved there, and taken back on the next run to build only the states
+    # the changes of the grammar reach. The table is the same as the one
+    # built from scratch. The item sets are not printed then.
+    # precedence and rule_precedence are used to settle conflicts, see
+    # ParsingTable.
+    def generateParsingTable(self, non_terminal, terminal, rules, lalr = False, state_file = None,
+                             precedence = None, rule_precedence = None):
+        previous = None
+        if state_file is not None and os.path.exists(state_file):
+            with open(state_file, 'rb') as saved:
+                previous = pickle.load(saved)
+            if previous.get('version') != STATE_VERSION:
+                previous = None
+
+        if previous is None:
+            ff = FirstFollowGenerator(non_terminal, terminal, rules)
+            reuse = None
+        else:
+            ff = FirstFollowGenerator(non_terminal, terminal, rules, previous['ff'])
+            reuse = reusable_states(previous['states'], previous['rules'], previous['ff'], rules, ff)
         print(ff.get_first())
         print(ff.get_follow())
-        lr1 = Itemset_LR1(non_terminal, terminal, rules, ff)
-        lr1.viewItems()
-        lr1.viewTransitions()
+        lr1 = Itemset_LR1(non_terminal, terminal, rules, ff, reuse)
+        if previous is not None:
+            print("LR(1) states reused: " + str(lr1.reused) + " of " + str(lr1.getID()))
+        if state_file is not None:
+            with open(state_file, 'wb') as saved:
+                pickle.dump({'version': STATE_VERSION, 'rules': [list(rule) for rule in rules], 'ff': ff,
+                             'states': lr1.saved_states()}, saved, pickle.HIGHEST_PROTOCOL)
+        if lalr:
+            lalr1 = Itemset_LALR1(lr1)
+            print("LR(1) states: " + str(lr1.getID()) + " -> LALR(1) states: " + str(lalr1.getID()))
+            # conflicts that only merging the states brought in
+            before = set((lalr1.merged[state], lookahead, productions)
+                         for state, lookahead, productions in reduce_reduce_conflicts(lr1.getItems(), rules))
+            for state, lookahead, productions in reduce_reduce_conflicts(lalr1.getItems(), rules):
+                if (state, lookahead, productions) not in before:
+                    print("New reduce/reduce conflict in LALR(1) state " + str(state) + " on " + lookahead + ": "
+                          + ", ".join(str(rules[production]) for production in sorted(productions)))
+            lr1 = lalr1
+        if state_file is None:
+            # too long to print on every edit of a big grammar
+            lr1.viewItems()
+            lr1.viewTransitions()
         print(lr1.getRules())
-        #print(lr1.getID())
-        pt = ParsingTable(non_terminal, terminal, lr1.getItems(), lr1.getRules(), lr1.getTransitions(), lr1.getID(), ff)
-        return(pt.generate_table())
+        pt = ParsingTable(non_terminal, terminal, lr1.getItems(), lr1.getRules(), lr1.getTransitions(), lr1.getID(), ff,
+                          precedence, rule_precedence)
+        pt.generate_table()
+        self.conflicts = pt.conflicts
+        self.table_data = pt.compress()
+        return(repr(self.table_data))
 
 
 #non_terminal = ["S'", "S", "C"]
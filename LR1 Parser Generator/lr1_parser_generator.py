@@ -1,49 +1,306 @@
 
 import datetime
+import os
+import re
+import sys
 from lr1_itemset_table_gen import MainLR1gen
 
-def readFile(fileName):
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(here))
+from generator_support import GenerationCache, dispatch, write_output
+
+# part of the cache key, to be raised whenever the generated code changes
+GENERATOR_VERSION = '1.11'
+
+template_path = os.path.join(here, "parser_template.py")
+cache_directory = os.path.join(here, ".generator_cache")
+
+# (non_terminal, terminal, rules, actions, precedence, rule_precedence) of
+# a grammar file, actions and rule_precedence having one entry per rule
+def read_grammar(fileName):
     grammar = open(fileName, 'r')
     temp = ""
     temp_grammar = []
+    actions = []
+    # %left, %right and %nonassoc lines among the rules, lowest precedence
+    # first: terminal -> (level, associativity)
+    precedence = dict()
+    rule_precedence = []
+    # symbols of the first two lines, { and % start an action or a
+    # declaration only where they aren't one of them
+    symbols = set()
     for line in grammar:
         for character in line:
             if (character != "\n"):
                 temp = temp + character
+        if len(temp_grammar) == 2 and len(symbols) == 0:
+            symbols = set(temp_grammar[0]) | set(temp_grammar[1])
+        words = temp.split()
+        if len(temp_grammar) >= 2 and len(words) > 0 and words[0].startswith('%') and words[0] not in symbols:
+            temp = words
+            if temp[0] not in ('%left', '%right', '%nonassoc'):
+                raise ValueError("Unknown declaration in " + fileName + ": " + temp[0])
+            level = max([level for level, associativity in precedence.values()], default = 0) + 1
+            for symbol in temp[1:]:
+                precedence[symbol] = (level, temp[0][1:])
+            temp = ""
+            continue
+        # a rule may end with an action: { python expression }, the { being
+        # the first word that starts with it and isn't a grammar symbol
+        action = None
+        if len(temp_grammar) >= 2 and temp.rstrip().endswith('}'):
+            for word in re.finditer(r'\S+', temp):
+                if word.group().startswith('{') and word.group() not in symbols:
+                    action = temp[word.start() + 1:temp.rindex('}')].strip()
+                    temp = temp[:word.start()]
+                    break
         temp = temp.split()
+        # and %prec symbol before it, giving the rule the precedence of symbol
+        prec = None
+        if len(temp_grammar) >= 2 and '%prec' in temp and '%prec' not in symbols:
+            i = temp.index('%prec')
+            if i + 1 >= len(temp):
+                raise ValueError("%prec without a symbol in " + fileName + ": " + ' '.join(temp))
+            prec = temp[i + 1]
+            temp = temp[:i] + temp[i + 2:]
         temp_grammar.append(temp)
+        actions.append(action)
+        rule_precedence.append(prec)
         temp = ""
 
     #print(temp_grammar)
     non_terminal = temp_grammar[0]
     terminal = temp_grammar[1]
     rules = temp_grammar[2:]
-    generate_parser(non_terminal, terminal, rules)
+    rule_precedence = rule_precedence[2:]
+    for prec in rule_precedence:
+        if prec is not None and prec not in precedence:
+            raise ValueError("%prec " + prec + " in " + fileName + " has no precedence declared")
+    return non_terminal, terminal, rules, actions[2:], precedence, rule_precedence
+
+def readFile(fileName, lalr = False, compiled = False, cache = None, incremental = False):
+    non_terminal, terminal, rules, actions, precedence, rule_precedence = read_grammar(fileName)
+
+    # named after the grammar file so the name stays the same between runs
+    outName = "58090030_lr1_parser_" + os.path.splitext(os.path.basename(fileName))[0] + ".py"
+    if cache is not None:
+        key = cache.key(GENERATOR_VERSION, non_terminal, terminal, rules, actions, precedence, rule_precedence,
+                        lalr, compiled, open(template_path, 'r').read())
+        cached = cache.get(key)
+        if cached is not None:
+            write_output(outName, cached)
+            print("Grammar unchanged, " + outName + " is up to date")
+            return outName
+
+    state_file = None
+    if incremental:
+        # item sets of the last run on this grammar file, see generateParsingTable
+        os.makedirs(cache_directory, exist_ok = True)
+        state_file = os.path.join(cache_directory, os.path.splitext(os.path.basename(fileName))[0] + ".lr1state")
+    generate_parser(non_terminal, terminal, rules, lalr, actions, compiled, outName, state_file,
+                    precedence, rule_precedence)
+    if cache is not None:
+        cache.put(key, open(outName, 'r').read())
+    return outName
+
+# $n must name a symbol of the right hand side of rule
+def check_action(rule, action):
+    for match in re.finditer(r'\$(\d+)', action):
+        if not 1 <= int(match.group(1)) <= len(rule) - 1:
+            raise ValueError(match.group() + " out of range in the action of " + ' '.join(rule) + ": " + action)
+
+# One function per production with an action, $1, $2, ... being the values
+# of the right hand side symbols
+def actions_formatter(rules, actions):
+    temp = ''
+    names = []
+    for i in range(len(rules)):
+        if actions is None or i >= len(actions) or actions[i] is None:
+            names.append('None')
+            continue
+        check_action(rules[i], actions[i])
+        code = re.sub(r'\$(\d+)', lambda match: 'v[' + str(int(match.group(1)) - 1) + ']', actions[i])
+        temp = temp + '# ' + ' '.join(rules[i]) + '\n'
+        temp = temp + 'def action_' + str(i) + '(v):\n    return ' + code + '\n\n'
+        names.append('action_' + str(i))
+
+    return temp + 'actions = [' + ', '.join(names) + ']'
+
+# Straight line code over the ints of the table: parse_tokens() made of
+# nested ifs on the state, then on the lookahead, giving the state to shift
+# to or -1 and the production to reduce by. Each reduction and its action
+# is written out in place. Both dispatches are binary splits so a
+# step costs a few int comparisons instead of the base/check/value lookups.
+def compiled_formatter(table_data, rules, actions):
+    symbols, productions, base, check, value, default = table_data
+    lhs_symbols = set(lhs for lhs, rhs in productions)
+    terminals = [i for i, symbol in enumerate(symbols) if symbol not in lhs_symbols]
+
+    def lookup(state, symbol):
+        i = base[state] + symbol
+        return value[i] if check[i] == state else 0
+
+    def is_error(state, symbol):
+        # a 0 kept in the row, an error even where the state has a default
+        i = base[state] + symbol
+        return check[i] == state and value[i] == 0
+
+    # goto of each nonterminal, by the state under the popped right hand side
+    gotos = dict()
+    for symbol in sorted(set(symbols.index(lhs) for lhs, rhs in productions)):
+        gotos[symbol] = dict()
+        for state in range(len(base)):
+            entry = lookup(state, symbol)
+            if entry > 0:
+                gotos[symbol][state] = entry - 1
 
-def generate_parser(non_terminal, terminal, rules):
+    # per state, the lookahead symbols cut into runs of neighbouring ids
+    # with the same action, split in half until one run is left
+    state_cases = []
+    for state in range(len(base)):
+        if default[state] < 0:
+            otherwise = ['state, production = -1, ' + str(-default[state] - 1)]
+        else:
+            otherwise = ['raise error(token, position)']
+        runs = []
+        for symbol in terminals:
+            entry = lookup(state, symbol)
+            if entry > 0:
+                lines = ['state = ' + str(entry - 1)]
+            elif entry < 0:
+                lines = ['state, production = -1, ' + str(-entry - 1)]
+            elif is_error(state, symbol):
+                lines = ['raise error(token, position)']
+            else:
+                lines = otherwise
+            if len(runs) == 0 or runs[-1][1] != lines:
+                runs.append((symbol, lines))
+        state_cases.append((state, dispatch('symbol', runs, '')))
+
+    production_cases = []
+    for production, (lhs, rhs) in enumerate(productions):
+        length = len(rhs)
+        if production == 0:
+            production_cases.append((production, ['return values[sp - 1]']))
+            continue
+        code = actions[production] if actions is not None and production < len(actions) else None
+        lines = ['children = values[sp - ' + str(length) + ':sp]',
+                 'if reduce is None:',
+                 '    result = (' + repr(lhs) + ', children)',
+                 'else:',
+                 '    result = reduce(' + repr(lhs) + ', ' + repr(rhs) + ', children)']
+        if code is not None:
+            code = re.sub(r'\$(\d+)', lambda match: 'values[sp - ' + str(length - int(match.group(1)) + 1) + ']', code)
+            lines = ['if run_actions:', '    result = ' + code, 'else:'] + ['    ' + line for line in lines]
+        if length > 0:
+            lines.append('sp -= ' + str(length))
+        lines.append('state = goto_' + str(symbols.index(lhs)) + '[states[sp - 1]]')
+        production_cases.append((production, ['# ' + ' '.join(rules[production])] + lines if production < len(rules) else lines))
+
+    temp = ''
+    for symbol, goto in gotos.items():
+        if len(goto) == 0:
+            continue
+        temp = temp + 'goto_' + str(symbol) + ' = ' + repr(goto) + '\n'
+    temp = temp + '''
+
+table_parse_tokens = parse_tokens
+
+
+def error(token, position):
+    if token is None:
+        return ParseError('Unexpected end of input', position, token)
+    return ParseError('Unexpected token ' + str(token) + ' at ' + str(position), position, token)
+
+
+# parse_tokens() compiled from the table, same arguments and results. The
+# instrumented parser only exists for the table, stats are counted there.
+def parse_tokens(tokens, reduce = None, ignore = (), stats = None, run_actions = True):
+    if stats is not None:
+        return parse_tokens_instrumented(tokens, stats, reduce, ignore, run_actions)
+    tokens = iter(tokens)
+    states = [0] * 64
+    values = [None] * 64
+    sp = 1
+    position = -1
+    end = symbol_id['$']
+
+    def next_token():
+        for token in tokens:
+            name = token[0] if isinstance(token, tuple) else token
+            if name not in ignore:
+                return token, symbol_id.get(name, -1)
+        return None, end
+
+    token, symbol = next_token()
+    position += 1
+    if symbol < 0:
+        raise error(token, position)
+    state = 0
+    while True:
+'''
+    temp = temp + '\n'.join(dispatch('state', state_cases, ' ' * 8)) + '\n'
+    temp = temp + '''        if state >= 0:
+            # shift
+            if sp == len(states):
+                states.extend([0] * sp)
+                values.extend([None] * sp)
+            states[sp] = state
+            values[sp] = token
+            sp += 1
+            token, symbol = next_token()
+            position += 1
+            if symbol < 0:
+                raise error(token, position)
+            continue
+'''
+    temp = temp + '\n'.join(dispatch('production', production_cases, ' ' * 8)) + '\n'
+    temp = temp + '''        if sp == len(states):
+            states.extend([0] * sp)
+            values.extend([None] * sp)
+        states[sp] = state
+        values[sp] = result
+        sp += 1
+
+
+'''
+    return temp
+
+def generate_parser(non_terminal, terminal, rules, lalr = False, actions = None, compiled = False, fileName = None,
+                    state_file = None, precedence = None, rule_precedence = None):
     data_temp = ""
     lr1 = MainLR1gen()
 
-    data = lr1.generateParsingTable(non_terminal, terminal, rules)
-
-    time = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-    fileName = "58090030_lr1_parser_" + time + ".py"
+    data = lr1.generateParsingTable(non_terminal, terminal, rules, lalr, state_file, precedence, rule_precedence)
 
-    automaton_template = "parser_template.py"
+    if fileName is None:
+        time = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        fileName = "58090030_lr1_parser_" + time + ".py"
 
-    template = open(automaton_template, 'r')
-    out_file = open(fileName, 'w')
+    template = open(template_path, 'r').read()
 
-    data_dump = "table = " + data
-    data_dump = data_dump + '\n\n' + template.read()
+    data_dump = "table_data = " + data + '\n\n' + actions_formatter(rules, actions)
+    if compiled:
+        # the compiled parse_tokens() goes after the library part of the
+        # template, replacing the table driven one
+        main = template.index("if __name__ == '__main__':")
+        template = template[:main] + compiled_formatter(lr1.table_data, rules, actions) + template[main:]
+    data_dump = data_dump + '\n\n' + template
 
-    out_file.write(data_dump)
-    out_file.close()
+    write_output(fileName, data_dump)
+    return fileName
 
 
 if __name__ == '__main__':
-    inp = input("Please enter file name (default is sampleGrammar.txt press enter to assign default): ")
+    # python lr1_parser_generator.py [grammar file] [--lalr] [--compiled] [--no-cache] [--incremental]
+    options = [arg for arg in sys.argv[1:] if arg.startswith('--')]
+    files = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    if(len(files) > 0):
+        inp = files[0]
+    else:
+        inp = input("Please enter file name (default is sampleGrammar.txt press enter to assign default): ")
     if(inp == ''):
         inp = "sampleGrammar.txt"
-    readFile(inp)
+    cache = None if '--no-cache' in options else GenerationCache(cache_directory)
+    readFile(inp, '--lalr' in options, '--compiled' in options, cache, '--incremental' in options)
     #cdcd$
@@ -1,39 +1,345 @@
 
+import importlib.util
+import json
+import multiprocessing
+import os
+import sys
+from array import array
+from functools import partial
+
+# table_data (see ParsingTable.compress): symbol names, productions as
+# (lhs, rhs), then the packed base, check, value and default arrays.
+# actions holds the function made from the action of each production, or
+# None.
+def load_table(data):
+    global symbols, productions, symbol_id, production_lhs, production_length, base, check, value, default
+    symbols, productions = data[0], data[1]
+    symbol_id = {symbol: i for i, symbol in enumerate(symbols)}
+    production_lhs = array('i', [symbol_id[lhs] for lhs, rhs in productions])
+    production_length = array('i', [len(rhs) for lhs, rhs in productions])
+    base = array('i', data[2])
+    check = array('i', data[3])
+    value = array('i', data[4])
+    default = array('i', data[5])
+
+load_table(table_data)
+no_actions = [None] * len(actions)
+
+
+class ParseError(Exception):
+    def __init__(self, message, position, token):
+        Exception.__init__(self, message)
+        self.position = position  # index of the token in the stream
+        self.token = token  # None at the end of the input
+
+
+# LR driver over any iterable of tokens, read one at a time. A token is a
+# (token_name, lexeme, ...) tuple as the scanner gives them, or just the
+# terminal name. Token names in ignore are skipped. A production with an
+# action in the grammar gets its value from it (actions[p], called with the
+# list of right hand side values, tokens for terminals). Other productions
+# give reduce(lhs, rhs, values) if reduce is set, or else a parse tree node
+# (lhs, [children]). Raises ParseError when the tokens don't match.
+# With stats, a ParserStats, the parse goes through
+# parse_tokens_instrumented() and is counted in it. With run_actions False
+# the actions of the grammar are left out, as if there were none.
+def parse_tokens(tokens, reduce = None, ignore = (), stats = None, run_actions = True):
+    if stats is not None:
+        return parse_tokens_instrumented(tokens, stats, reduce, ignore, run_actions)
+    rule_actions = actions if run_actions else no_actions
+    tokens = iter(tokens)
+    # state and value stacks, grown by doubling; sp is the number of entries
+    states = [0] * 64
+    values = [None] * 64
+    sp = 1
+    position = -1
+    end = symbol_id['$']
+
+    def next_token():
+        for token in tokens:
+            name = token[0] if isinstance(token, tuple) else token
+            if name not in ignore:
+                return token, symbol_id.get(name, -1)
+        return None, end
+
+    token, symbol = next_token()
+    position += 1
+    while True:
+        state = states[sp - 1]
+        if symbol < 0:
+            action = 0
+        else:
+            i = base[state] + symbol
+            action = value[i] if check[i] == state else default[state]
+        if action > 0:
+            if sp == len(states):
+                states.extend([0] * sp)
+                values.extend([None] * sp)
+            states[sp] = action - 1
+            values[sp] = token
+            sp += 1
+            token, symbol = next_token()
+            position += 1
+        elif action < 0:
+            production = -action - 1
+            if production == 0:
+                return values[sp - 1]
+            length = production_length[production]
+            children = values[sp - length:sp]
+            sp -= length
+            action_function = rule_actions[production]
+            if action_function is not None:
+                result = action_function(children)
+            elif reduce is None:
+                result = (productions[production][0], children)
+            else:
+                result = reduce(productions[production][0], productions[production][1], children)
+            state = states[sp - 1]
+            i = base[state] + production_lhs[production]
+            goto = value[i] if check[i] == state else 0
+            if goto <= 0:
+                raise ParseError('Unexpected ' + productions[production][0], position, token)
+            # the reduction popped at least as much as it pushes, no growth
+            # needed unless the production was empty
+            if sp == len(states):
+                states.extend([0] * sp)
+                values.extend([None] * sp)
+            states[sp] = goto - 1
+            values[sp] = result
+            sp += 1
+        else:
+            if token is None:
+                raise ParseError('Unexpected end of input', position, token)
+            raise ParseError('Unexpected token ' + str(token) + ' at ' + str(position), position, token)
+
+
+# parse_tokens() counting what the parser does in stats: the states it goes
+# through, the terminals it shifts, the productions it reduces by and how
+# deep the stack gets. A copy of the loop, so parse_tokens() itself carries
+# no counters.
+def parse_tokens_instrumented(tokens, stats, reduce = None, ignore = (), run_actions = True):
+    stats.inputs += 1
+    rule_actions = actions if run_actions else no_actions
+    tokens = iter(tokens)
+    states = [0] * 64
+    values = [None] * 64
+    sp = 1
+    position = -1
+    end = symbol_id['$']
+
+    def next_token():
+        for token in tokens:
+            name = token[0] if isinstance(token, tuple) else token
+            if name not in ignore:
+                return token, symbol_id.get(name, -1)
+        return None, end
+
+    token, symbol = next_token()
+    position += 1
+    stats.visit(0, sp)
+    while True:
+        state = states[sp - 1]
+        if symbol < 0:
+            action = 0
+        else:
+            i = base[state] + symbol
+            action = value[i] if check[i] == state else default[state]
+        if action > 0:
+            if sp == len(states):
+                states.extend([0] * sp)
+                values.extend([None] * sp)
+            states[sp] = action - 1
+            values[sp] = token
+            sp += 1
+            stats.shift(action - 1, symbol, sp)
+            token, symbol = next_token()
+            position += 1
+        elif action < 0:
+            production = -action - 1
+            stats.reductions[production] = stats.reductions.get(production, 0) + 1
+            if production == 0:
+                return values[sp - 1]
+            length = production_length[production]
+            children = values[sp - length:sp]
+            sp -= length
+            action_function = rule_actions[production]
+            if action_function is not None:
+                result = action_function(children)
+            elif reduce is None:
+                result = (productions[production][0], children)
+            else:
+                result = reduce(productions[production][0], productions[production][1], children)
+            state = states[sp - 1]
+            i = base[state] + production_lhs[production]
+            goto = value[i] if check[i] == state else 0
+            if goto <= 0:
+                stats.errors += 1
+                raise ParseError('Unexpected ' + productions[production][0], position, token)
+            if sp == len(states):
+                states.extend([0] * sp)
+                values.extend([None] * sp)
+            states[sp] = goto - 1
+            values[sp] = result
+            sp += 1
+            stats.visit(goto - 1, sp)
+        else:
+            stats.errors += 1
+            if token is None:
+                raise ParseError('Unexpected end of input', position, token)
+            raise ParseError('Unexpected token ' + str(token) + ' at ' + str(position), position, token)
+
+
+# Counters for parse_tokens_instrumented(), summed over every input parsed
+# with them and written out with to_json(). States are numbered as in the
+# table, terminals and productions are given by name.
+class ParserStats:
+    def __init__(self):
+        self.state_visits = dict()  # state -> times pushed on the stack
+        self.shifts = dict()  # terminal -> times shifted
+        self.reductions = dict()  # production -> times reduced by
+        self.max_depth = 0  # most entries on the stack at once
+        self.inputs = 0
+        self.errors = 0
+
+    def visit(self, state, depth):
+        self.state_visits[state] = self.state_visits.get(state, 0) + 1
+        if depth > self.max_depth:
+            self.max_depth = depth
+
+    def shift(self, state, symbol, depth):
+        self.shifts[symbol] = self.shifts.get(symbol, 0) + 1
+        self.visit(state, depth)
+
+    def to_dict(self):
+        def by_count(counts):
+            return sorted(counts.items(), key = lambda item: (-item[1], item[0]))
+
+        def production_name(production):
+            lhs, rhs = productions[production]
+            return lhs + ' -> ' + ' '.join(rhs)
+
+        return {
+            'inputs': self.inputs,
+            'errors': self.errors,
+            'tokens': sum(self.shifts.values()),
+            'max_stack_depth': self.max_depth,
+            'state_visits': [{'state': state, 'count': count} for state, count in by_count(self.state_visits)],
+            'shifts': {symbols[symbol]: count for symbol, count in by_count(self.shifts)},
+            'reductions': [{'production': production, 'rule': production_name(production), 'count': count}
+                           for production, count in by_count(self.reductions)],
+        }
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent = 1)
+
+# Scanner and parser in one pass over a file: scanner is a generated scanner
+# module, its tokens are read from the file only as the parser needs them.
+def parse_file(fileName, scanner, reduce = None, ignore = (), stats = None):
+    scanner_table = scanner.ScannerTable.load(scanner.scanner_table_data)
+    with open(fileName, 'rb') as source:
+        return parse_tokens(scanner.scan_stream(source, scanner_table), reduce, ignore, stats)
+
+
+def load_module(fileName):
+    spec = importlib.util.spec_from_file_location(os.path.splitext(os.path.basename(fileName))[0], fileName)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def no_value(lhs, rhs, values):
+    return None
+
+
+# (accepted, position, message) for one input, a string (every character is
+# a terminal) or an iterable of tokens. position is the index of the token
+# where parsing failed and message the error, both None when accepted. No
+# parse tree is built and the actions of the grammar don't run, so an
+# action failing on some input can't stop a batch.
+def check_input(tokens, ignore = (), stats = None):
+    try:
+        parse_tokens(tokens, no_value, ignore, stats, False)
+        return (True, None, None)
+    except ParseError as error:
+        return (False, error.position, str(error))
+
+
+def init_worker(data):
+    load_table(data)
+
+
+# check_input() over many inputs, results in the same order. With workers
+# other than 1 the inputs are spread over a pool of that many processes
+# (None for one per CPU), sent chunksize at a time, each worker loading the
+# table once. Inputs are read as the pool needs them and results yielded as
+# they come back, so they don't all have to fit in memory. stats (a
+# ParserStats) can only be kept in this process, with workers = 1.
+def parse_batch(inputs, workers = 1, chunksize = 256, ignore = (), stats = None):
+    if workers == 1:
+        for tokens in inputs:
+            yield check_input(tokens, ignore, stats)
+        return
+    if stats is not None:
+        raise ValueError('stats are only kept with workers = 1')
+    with multiprocessing.Pool(workers, initializer = init_worker, initargs = (table_data,)) as pool:
+        yield from pool.imap(partial(check_input, ignore = ignore), inputs, chunksize)
+
+
 def parse(input_string):
-    stack = ['$', 0]
-    input_string = input_string + '$'
-    input_index = 0
-
-    start_symbol = "S'"
-    while stack[-1] != 'accept':
-        # print(stack)
-        current_state = stack[-1]
-        if input_string[input_index] not in table[current_state]:
-            # reject the string
-            print('String ' + input_string[:-1] + ' Rejected!')
-            break
-        action, goto = table[current_state][input_string[input_index]]
-        if action == 's':
-            stack.append(input_string[input_index])
-            stack.append(goto)
-            input_index += 1
-        elif action == 'r':
-            new_symbol, RHS = goto
-            for item in RHS:
-                stack.pop()  # state number
-                stack.pop()  # symbol
-            stack.append(new_symbol)
-            if new_symbol not in table[stack[-2]]:
-                # reject the string
-                print('String ' + input_string[:-1] + ' Rejected!')
-                break
-            _, goto = table[stack[-2]][new_symbol]
-            stack.append(goto)
-    if stack[-1] == 'accept':
-        print('String ' + input_string[:-1] + ' Accepted!')
+    # every character is a terminal
+    if check_input(input_string)[0]:
+        print('String ' + input_string + ' Accepted!')
+    else:
+        print('String ' + input_string + ' Rejected!')
 
 
 if __name__ == '__main__':
+    # python parser.py scanner.py input.txt [--ignore=t_ws,...] parses a file
+    # with the tokens of a generated scanner. With --batch every line of the
+    # file is an input of its own (scanned with scanner.py if given, else
+    # one terminal per character), --workers=N parses them in N processes.
+    # --stats=file.json writes what the parser did to it (not with workers).
+    options = [arg for arg in sys.argv[1:] if arg.startswith('--')]
+    files = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    ignore = set()
+    workers = 1
+    stats = None
+    for option in options:
+        if option.startswith('--ignore='):
+            ignore.update(option[len('--ignore='):].split(','))
+        if option.startswith('--workers='):
+            workers = int(option[len('--workers='):]) or None
+        if option.startswith('--stats='):
+            statsName = option[len('--stats='):]
+            stats = ParserStats()
+
+    def write_stats():
+        if stats is not None:
+            with open(statsName, 'w') as stats_file:
+                stats_file.write(stats.to_json())
+
+    if '--batch' in options and len(files) in (1, 2):
+        with open(files[-1], 'r') as source:
+            lines = (line.rstrip('\n') for line in source)
+            if len(files) == 2:
+                scanner = load_module(files[0])
+                scanner_table = scanner.ScannerTable.load(scanner.scanner_table_data)
+                lines = ([token[:2] for token in scanner.scan(line, scanner_table)] for line in lines)
+            for number, (accepted, position, message) in enumerate(parse_batch(lines, workers, ignore = ignore, stats = stats)):
+                if accepted:
+                    print(str(number + 1) + ': Accepted')
+                else:
+                    print(str(number + 1) + ': Rejected: ' + message)
+        write_stats()
+        sys.exit()
+    if len(files) == 2:
+        try:
+            print(parse_file(files[1], load_module(files[0]), ignore = ignore, stats = stats))
+        except ParseError as error:
+            print('Rejected: ' + str(error))
+        write_stats()
+        sys.exit()
+
     print()
     while (True):
         inp = input("Please enter string to parse: ")
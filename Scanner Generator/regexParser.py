@@ -1,257 +1,304 @@
-class Stack:
-    def __init__(self):
-        self.data = []
-        self.currentPos = 0
-        self.start = []
-
-    def push(self, value):
-        self.data.append(value)
-
-    def pop(self):
-        return self.data.pop()
-
-    def print_value(self):
-        print(self.data)
-
-    def previous(self):
-        return self.data[-1]
-
-    def empty(self):
-        if(len(self.data) == 0):
-            return True
+# Regex syntax of the rule files (whitespace is ignored unless escaped)
+#   ab      concatenation
+#   a|b     alternation
+#   a* a+ a?  repetition
+#   (a)     grouping
+#   [a-z0-9_]  character class, [^"] negated class
+#   .       any character but a newline
+#   \. \* \| ...  escaped operator, \n \t \r \s \d \w as usual
+
+operator_list = ['(', ')', '|', '*', '+', '?', '[', ']', '.']
+escapes = {'n': '\n', 't': '\t', 'r': '\r', 'f': '\f', 'v': '\v'}
+escape_classes = {
+    'd': '0123456789',
+    'w': 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_',
+    's': ' \t\n\r\f\v',
+}
+
+# A set of characters is a pair (negated, chars): when negated is True it
+# stands for every character that is not in chars.
+ANY = (True, frozenset('\n'))
+
+def read_escape(regex, i):
+    # regex[i] is the character after the backslash
+    if i >= len(regex):
+        raise ValueError("Regex ends with a backslash: " + regex)
+    character = regex[i]
+    if character in escape_classes:
+        return frozenset(escape_classes[character])
+    return frozenset(escapes.get(character, character))
+
+def read_class(regex, i):
+    # regex[i] is the character after '[', returns the set and the index after ']'
+    negated = False
+    if i < len(regex) and regex[i] == '^':
+        negated = True
+        i += 1
+    chars = set()
+    first = True
+    while True:
+        if i >= len(regex):
+            raise ValueError("Missing ] in regex: " + regex)
+        character = regex[i]
+        if character == ']' and not first:
+            return (negated, frozenset(chars)), i + 1
+        first = False
+        if character == '\\':
+            low = read_escape(regex, i + 1)
+            i += 2
         else:
-            return False
-
-operator_list = ['(', '|', '*', ')', '_']
-operator_order = {'(' : 0 ,'_' : 1, '|' : 2, '*' : 3} #_ is concat
-
-def extract_alphabet(regex):
-    alphabet = []
-    for character in regex:
-        if(character in operator_list):
-            pass
+            low = frozenset(character)
+            i += 1
+        # a range like a-z, a '-' at either end is a literal
+        if len(low) == 1 and i + 1 < len(regex) and regex[i] == '-' and regex[i + 1] != ']':
+            if regex[i + 1] == '\\':
+                high = read_escape(regex, i + 2)
+                i += 3
+            else:
+                high = frozenset(regex[i + 1])
+                i += 2
+            if len(high) != 1:
+                raise ValueError("Bad range in regex: " + regex)
+            low, high = ord(min(low)), ord(min(high))
+            if low > high:
+                raise ValueError("Bad range in regex: " + regex)
+            chars.update(chr(code) for code in range(low, high + 1))
         else:
-            alphabet.append(character)
-
-    return alphabet
-
-def change_to_Postfix(regex):
-    stack = Stack()
-    output = []
-    for character in regex:
-        #print(character)
-        #stack.print_value()
-        if(character not in operator_list):
-            output.append(character)
-
-        elif(character == '('):
-            stack.push(character)
-
-        elif(character == ')'):
-            temp = stack.pop()
-            while(temp != '('):
-                output.append(temp)
-                temp = stack.pop()
-
+            chars.update(low)
+
+def split_regex(regex):
+    # list of operators and character sets
+    tokens = []
+    i = 0
+    while i < len(regex):
+        character = regex[i]
+        if character in ' \t\n\r':
+            i += 1
+        elif character == '\\':
+            tokens.append((False, read_escape(regex, i + 1)))
+            i += 2
+        elif character == '[':
+            charset, i = read_class(regex, i + 1)
+            tokens.append(charset)
+        elif character == '.':
+            tokens.append(ANY)
+            i += 1
+        elif character in operator_list:
+            tokens.append(character)
+            i += 1
         else:
-            while(not stack.empty() and (operator_order[stack.previous()] >= operator_order[character])):
-                output.append(stack.pop())
-            stack.push(character)
-
-    while(not stack.empty()):
-        temp = stack.pop()
-        output.append(temp)
-
-    return output
-
-def thompson(regex, alphabet):
-    delta = []
-    delta_temp = []
-    stack = Stack()
-
-    startNode = 0
-    acceptNode = 1
-    cnt = -1
-
-    for character in regex:
-        if character in alphabet:
-            cnt = cnt + 1
-            currentNode = cnt
-            cnt = cnt + 1
-            nextNode = cnt
-            delta.append({})
-            delta.append({})
-            stack.push([currentNode, nextNode])
-            #stack.print_value()
-            delta[currentNode][(currentNode,character)] = {nextNode}
-            #print(delta)
-
-        elif character == '*':
-            fromNode, toNode = stack.pop()
-            cnt = cnt + 1
-            currentNode = cnt
-            cnt = cnt + 1
-            nextNode = cnt
-            delta.append({})
-            delta.append({})
-            stack.push([currentNode, nextNode])
-            delta[toNode][(toNode,'')] = {fromNode, nextNode}
-            delta[currentNode][(currentNode,'')] = {fromNode}
-            if startNode == fromNode:
-                startNode = currentNode
-            if acceptNode == toNode:
-                acceptNode = nextNode
-            #print(delta)
-
-        elif character == '_':
-            fromNode1, toNode1 = stack.pop()
-            fromNode2, toNode2 = stack.pop()
-            toNode1 = fromNode1
-            fromNode1 = toNode2
-            stack.push([fromNode2, toNode1])
-            elem = delta[toNode1]
-            del delta[toNode1]
-            for key in elem.keys():
-                #print("KEY",key)
-                #print("ELIM-KEY ", elem.get(key) - 1)
-                temp = key[1]
-                #print("TEMP", temp[1])
-                delta[fromNode1][(fromNode1, temp)] = {int(list(elem.get(key))[0]) - 1}
-            cnt = cnt - 1
-            if startNode == fromNode1:
-                startNode = fromNode2
-            if acceptNode == toNode2:
-                acceptNode = toNode1
-            #print(delta)
-
+            tokens.append((False, frozenset(character)))
+            i += 1
+    return tokens
+
+# Recursive descent over split_regex() output. The tree is made of tuples:
+# ('set', charset), ('cat', a, b), ('alt', a, b), ('star', a), ('plus', a),
+# ('opt', a) and ('empty',).
+class Parser:
+    def __init__(self, regex):
+        self.regex = regex
+        self.tokens = split_regex(regex)
+        self.pos = 0
+
+    def peek(self):
+        if self.pos < len(self.tokens):
+            return self.tokens[self.pos]
+        return None
+
+    def parse(self):
+        tree = self.alternation()
+        if self.peek() is not None:
+            raise ValueError("Unexpected " + str(self.peek()) + " in regex: " + self.regex)
+        return tree
+
+    def alternation(self):
+        tree = self.concatenation()
+        while self.peek() == '|':
+            self.pos += 1
+            tree = ('alt', tree, self.concatenation())
+        return tree
+
+    def concatenation(self):
+        tree = None
+        while self.peek() is not None and self.peek() not in ('|', ')'):
+            item = self.repetition()
+            tree = item if tree is None else ('cat', tree, item)
+        if tree is None:
+            return ('empty',)
+        return tree
+
+    def repetition(self):
+        tree = self.atom()
+        while self.peek() in ('*', '+', '?'):
+            tree = ({'*': 'star', '+': 'plus', '?': 'opt'}[self.peek()], tree)
+            self.pos += 1
+        return tree
+
+    def atom(self):
+        token = self.peek()
+        self.pos += 1
+        if token == '(':
+            tree = self.alternation()
+            if self.peek() != ')':
+                raise ValueError("Missing ) in regex: " + self.regex)
+            self.pos += 1
+            return tree
+        if isinstance(token, tuple):
+            return ('set', token)
+        raise ValueError("Unexpected " + str(token) + " in regex: " + self.regex)
+
+def collect_sets(tree, sets):
+    if tree[0] == 'set':
+        sets.append(tree[1])
+    else:
+        for child in tree[1:]:
+            collect_sets(child, sets)
+    return sets
+
+def alphabet_classes(sets):
+    # Split the characters into disjoint classes: two characters share a
+    # class when every set of the rules either holds both or none of them.
+    # Each class is named by one of its characters. Characters not written
+    # in any rule form one more class, the default, needed only when a
+    # negated set or '.' is used.
+    universe = set()
+    for negated, chars in sets:
+        universe.update(chars)
+
+    groups = dict()
+    for character in sorted(universe):
+        signature = tuple((character in chars) != negated for negated, chars in sets)
+        groups.setdefault(signature, []).append(character)
+
+    default = None
+    if any(negated for negated, chars in sets):
+        signature = tuple(negated for negated, chars in sets)
+        if signature in groups:
+            default = groups[signature][0]
         else:
-            cnt = cnt + 1
-            currentNode = cnt
-            cnt = cnt + 1
-            nextNode = cnt
-            delta.append({})
-            delta.append({})
-            fromNode1, toNode1 = stack.pop()
-            fromNode2, toNode2 = stack.pop()
-            stack.push([currentNode, nextNode])
-            delta[currentNode][(currentNode,'')] = {fromNode2, fromNode1}
-            delta[toNode1][(toNode1,'')] = {nextNode}
-            delta[toNode2][(toNode2,'')] = {nextNode}
-            if startNode == fromNode1 or startNode == fromNode2:
-                startNode = currentNode
-            if acceptNode == toNode2 or acceptNode == toNode1:
-                acceptNode = nextNode
-            #print(delta)
-
-    temp = []
-    for element in delta:
-        if(element == {}):
-            temp.append(element)
-            delta_temp.append(temp)
-            temp = []
+            code = 0
+            while chr(code) in universe:
+                code += 1
+            default = chr(code)
+            groups[signature] = []
+
+    classes = dict()
+    for signature, chars in groups.items():
+        if len(chars) > 0:
+            classes[chars[0]] = ''.join(chars)
         else:
-            temp.append(element)
-
-    #print(delta)
-    iteration = 0
-    if(len(delta_temp)> 1):
-        for each_set in delta_temp:
-            iteration += 1
-            if(iteration == len(delta_temp)):
-                break
-            else:
-                #print(each_set)
-                next_start = delta_temp[iteration][-2]
-                next_start_key = list(next_start.keys())[0]
-                next_start_values = list(next_start.values())[0]
-                this_start = each_set[-2]
-                this_start_key = list(this_start.keys())[0]
-                this_start_values = list(this_start.values())[0]
-                #print(this_start_values)
-                this_begin = each_set[0]
-                this_begin_key = list(this_begin.keys())[0]
-
-                #print(next_start)
-                #print(next_start_key[0])
-                #print(next_start_values)
-                #print(this_start_key[0])
-                #print(this_start_values)
-                #print(list(this_start_values)[0])
-                this_end = {(list(this_start_key)[0]+1, '') : {next_start_key[0]}}
-                each_set[-1] = this_end
-
-                next_start_values.add(this_begin_key[0])
-                next_start[next_start_key] = next_start_values
-                startNode = next_start_key[0]
-                acceptNode = next_start_key[0]+1
-
-
-    delta = delta_temp
-
-    return delta, startNode, acceptNode
-
-def formatter(name, delta, start, accept, alphabet):
-    #Get Q
-    Q = ''
-    for i in range(0,accept+1):
-        Q = Q + str(i) + ','
-    Q = '{' + Q[:-1] + '}'
+            classes[default] = ''
+    return classes, default
+
+def symbols_of(charset, classes):
+    # the classes a set is made of, tested on their first character
+    negated, chars = charset
+    return [symbol for symbol in classes if (symbol in chars) != negated]
+
+# Thompson's construction, states are numbered from self.count on
+class NFABuilder:
+    def __init__(self, classes, count = 0):
+        self.classes = classes
+        self.count = count
+        self.delta = dict()
+
+    def new_state(self):
+        self.count += 1
+        return self.count - 1
+
+    def add(self, q, c, next_state):
+        self.delta.setdefault((q, c), set()).add(next_state)
+
+    def build(self, tree):
+        kind = tree[0]
+        if kind == 'cat':
+            start1, accept1 = self.build(tree[1])
+            start2, accept2 = self.build(tree[2])
+            self.add(accept1, '', start2)
+            return start1, accept2
+
+        start = self.new_state()
+        if kind == 'set':
+            accept = self.new_state()
+            for symbol in symbols_of(tree[1], self.classes):
+                self.add(start, symbol, accept)
+        elif kind == 'empty':
+            accept = self.new_state()
+            self.add(start, '', accept)
+        elif kind == 'alt':
+            start1, accept1 = self.build(tree[1])
+            start2, accept2 = self.build(tree[2])
+            accept = self.new_state()
+            self.add(start, '', start1)
+            self.add(start, '', start2)
+            self.add(accept1, '', accept)
+            self.add(accept2, '', accept)
+        else:
+            inner_start, inner_accept = self.build(tree[1])
+            accept = self.new_state()
+            self.add(start, '', inner_start)
+            self.add(inner_accept, '', accept)
+            if kind in ('star', 'opt'):
+                self.add(start, '', accept)
+            if kind in ('star', 'plus'):
+                self.add(inner_accept, '', inner_start)
+        return start, accept
+
+def union(regex_list):
+    return build_nfa(parse_rules(regex_list))
+
+# (token name, syntax tree) of each (token name, regex) rule
+def parse_rules(regex_list):
+    return [(name, Parser(regex).parse()) for name, regex in regex_list]
+
+# One NFA for every rule: a new start state 0 with an empty string
+# transition to the start of each rule. Each accept state remembers its
+# token name, the order of trees is the rule priority. The NFA reads
+# alphabet classes, named by their first character.
+def build_nfa(trees):
+    sets = []
+    for name, tree in trees:
+        collect_sets(tree, sets)
+    classes, default = alphabet_classes(sets)
+
+    builder = NFABuilder(classes, 1)
+    F = dict()
+    names = []
+    for name, tree in trees:
+        startNode, acceptNode = builder.build(tree)
+        builder.add(0, '', startNode)
+        F[acceptNode] = name
+        names.append(name)
+
+    Q = set(range(builder.count))
+    return Q, set(classes), builder.delta, 0, F, names, classes, default
+
+def union_formatter(Q, Sigma, delta, q0, F, names, classes, default):
+    Q = '{' + ','.join(str(q) for q in sorted(Q)) + '}'
     print("Q: ", Q)
 
-    #get Sigma
-    Sigma = set(alphabet)
-    temp = ''
-    for i in Sigma:
-        temp = temp + "'" + str(i) + "',"
-    Sigma = '{' + temp[:-1] +'}'
+    Sigma = '{' + ','.join(repr(c) for c in sorted(Sigma)) + '}'
     print("Sigma: ", Sigma)
 
-    #getDelta
-    temp = '{'
-    for each_set in delta:
-        for each_pair in each_set:
-            temp = temp + str(each_pair)[1:-1] + ','
-
-    temp = temp[:-2] + '}'
-    delta = temp
+    temp = []
+    for key in sorted(delta):
+        temp.append(repr(key) + ': {' + ','.join(str(q) for q in sorted(delta[key])) + '}')
+    delta = '{' + ','.join(temp) + '}'
     print("Delta: ", delta)
 
-    #get q0
-    q0 = str(start)
-    print("q0: ", start)
+    q0 = str(q0)
+    print("q0: ", q0)
 
-    #get F
-    F = '{' + str(accept) + '}'
+    F = '{' + ','.join(str(q) + ': ' + repr(F[q]) for q in sorted(F)) + '}'
     print("F: ", F)
 
-    #get Name
-    name = str(name)
-    print("Name: ", name)
+    names = '[' + ','.join(repr(name) for name in names) + ']'
+    print("Names: ", names)
 
-    output_string = '['+ Q + ',' + Sigma + ',' + delta + ',' + q0 + ',' + F + ',"' + name + '"]'
-    print(output_string)
-
-    return output_string
+    classes = '{' + ','.join(repr(c) + ': ' + repr(classes[c]) for c in sorted(classes)) + '}'
+    print("Classes: ", classes, "Default: ", repr(default))
 
-def parse(name, regex, regexList):
-    print(regex)
-    regex = change_to_Postfix(regex)
-    print(regex)
-    regex = ''.join(regex)
-    #print(regex)
-    alphabet = extract_alphabet(regex)
-    #print(alphabet)
-    delta, startNode, acceptNode = thompson(regex, alphabet)
-    #print(delta, startNode, acceptNode, alphabet_all)
-    alphabet_all = []
-    if(regexList is not None):
-        for each_regex in regexList:
-            for items in extract_alphabet(each_regex[1]):
-                alphabet_all.append(items)
-        #print(alphabet_all)
-        output_string = formatter(name, delta, startNode, acceptNode, alphabet_all)
-    else:
-        output_string = formatter(name, delta, startNode, acceptNode, alphabet)
+    output_string = '[' + Q + ',' + Sigma + ',' + delta + ',' + q0 + ',' + F + ',' + names + ',' + classes + ',' + repr(default) + ']'
+    print(output_string)
 
     return output_string
-
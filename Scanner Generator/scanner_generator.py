@@ -1,92 +1,224 @@
 import datetime
+import os
+import re
+import sys
 import regexParser as rp
+import scanner_template as st
 
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(here))
+from generator_support import GenerationCache, dispatch, write_output
 
-def regex_preformatter(regex):
-    temp = ""
-    iteration = 0
-    open = None
-    operator_list = ['(', '|', '*', ')', '_']
-    for character in regex:
-        temp = temp + character
-        if(iteration == len(regex)-1):
-            break
-        if(regex[iteration+1] not in operator_list):
-            if(character not in operator_list):
-                if(open is None):
-                    temp = temp[:-1] + '(' + character
-                    temp = temp + '_'
-                    open = ""
-                else:
-                    temp = temp + '_'
-        if (regex[iteration + 1] in operator_list and open == ""):
-            temp = temp + ')'
-            open = None
+# part of the cache key, to be raised whenever the generated code changes
+GENERATOR_VERSION = '1.9'
 
-        iteration += 1
+template_path = os.path.join(here, "scanner_template.py")
+cache_directory = os.path.join(here, ".generator_cache")
 
-    return temp
+
+def build_table(nfa_data):
+    nfa = st.NFA(nfa_data[0], nfa_data[1], nfa_data[2], nfa_data[3], nfa_data[4], nfa_data[5])
+    dfa = nfa.convert_to_DFA()
+    states_before = len(dfa.Q)
+    dfa = dfa.minimize()
+    print("DFA states: " + str(states_before) + " -> " + str(len(dfa.Q)) + " after minimization")
+
+    return st.ScannerTable.from_DFA(dfa, nfa_data[6], nfa_data[7])
 
 def regex_formatter(regex_list):
+    # all rules go into one NFA, determinized and minimized here so the
+    # scanner only has to load the table. The NFA is kept in a function for
+    # the lazy mode, it is not built unless asked for.
+    nfa_data = rp.union(regex_list)
+    parse = rp.union_formatter(*nfa_data)
+    table = build_table(nfa_data)
+
+    return 'scanner_table_data = ' + repr(table.dump()) + '\n\ndef scanner_nfa():\n    return ' + parse, table
+
+# The DFA of table as Python code: scan() with nested ifs on the state and,
+# in each state, a membership test per next state on a frozenset of the
+# characters leading there. A state that loops on itself eats the whole run
+# of such characters at once, with a plain loop or, with use_re, the match
+# of a compiled character class.
+def compiled_formatter(table, use_re = False):
+    num_classes = table.num_classes
+    class_chars = [''] * num_classes
+    unreadable = ''
+    for character in sorted(table.classes):
+        c = table.classes[character]
+        if c < 0:
+            unreadable = unreadable + character
+        else:
+            class_chars[c] = class_chars[c] + character
+
+    constants = dict()  # (prefix, chars) -> name of the frozenset or run
+
+    def charset(chars, prefix):
+        if (prefix, chars) not in constants:
+            number = sum(1 for other, chars in constants if other == prefix)
+            constants[(prefix, chars)] = prefix + str(number)
+        return constants[(prefix, chars)]
+
+    def condition(negated, chars):
+        if len(chars) == 1 and not negated:
+            return 'character == ' + repr(chars)
+        return 'character ' + ('not in ' if negated else 'in ') + charset(chars, 'set_')
+
+    state_cases = []
+    for q in range(len(table.accept)):
+        targets = dict()
+        for c in range(num_classes):
+            next_state = table.transitions[q * num_classes + c]
+            if next_state >= 0:
+                targets.setdefault(next_state, []).append(c)
+        tests = []
+        for next_state, on in sorted(targets.items()):
+            if table.default in on:
+                # every character but those of the other classes
+                chars = unreadable + ''.join(class_chars[c] for c in range(num_classes) if c not in on)
+                tests.append((True, ''.join(sorted(chars)), next_state))
+            else:
+                tests.append((False, ''.join(sorted(''.join(class_chars[c] for c in on))), next_state))
+        # a negated set is the last test, it takes everything left
+        tests.sort(key=lambda test: test[0])
+
+        lines = []
+        for negated, chars, next_state in tests:
+            lines.append(('if ' if len(lines) == 0 else 'elif ') + condition(negated, chars) + ':')
+            if next_state == q:
+                lines.append('    count += 1')
+                if negated and chars == '':
+                    # every character loops here, the run goes to the end
+                    lines.append('    count = length')
+                elif use_re:
+                    pattern = '[' + ('^' if negated else '') + ''.join(re.escape(character) for character in chars) + ']*'
+                    lines.append('    count = ' + charset(pattern, 'run_') + '(input_string, count).end()')
+                else:
+                    test = ' not in ' if negated else ' in '
+                    lines.append('    while count < length and input_string[count]' + test + charset(chars, 'set_') + ':')
+                    lines.append('        count += 1')
+            else:
+                lines.append('    state = ' + str(next_state))
+                lines.append('    count += 1')
+            if table.accept[next_state] >= 0:
+                lines.append('    lastAccept = ' + str(table.accept[next_state]))
+                lines.append('    lastEnd = count')
+        if len(lines) == 0:
+            lines = ['break']
+        else:
+            lines = lines + ['else:', '    break']
+        state_cases.append((q, lines))
+
+    temp = ''
+    for (prefix, chars), name in sorted(constants.items(), key=lambda item: item[0][0] == 'run_'):
+        if prefix == 'set_':
+            temp = temp + name + ' = frozenset(' + repr(chars) + ')\n'
+        else:
+            temp = temp + name + ' = re.compile(' + repr(chars) + ').match\n'
+    temp = temp + '''
+
+table_scan = scan
+
+
+# scan() compiled from the DFA of scanner_table_data, same arguments and
+# results. Any ScannerTable given is taken to be that one, a LazyDFA goes
+# to the table driven scan.
+def scan(input_string, table, start = 0, final = True):
+    if not isinstance(table, ScannerTable):
+        yield from table_scan(input_string, table, start, final)
+        return
+    names = table.names
+    length = len(input_string)
+    while start < length:
+        state = ''' + str(table.start) + '''
+        lastAccept = -1
+        lastEnd = start
+        count = start
+        while True:
+            if count >= length:
+                if not final:
+                    # the token may go on in the text that comes next
+                    return
+                break
+            character = input_string[count]
+'''
+    temp = temp + '\n'.join(dispatch('state', state_cases, ' ' * 12)) + '\n'
+    temp = temp + '''
+        if lastAccept < 0:
+            # no rule matches here, report the single character and move on
+            yield (None, input_string[start], start, start + 1)
+            start += 1
+        else:
+            yield (names[lastAccept], input_string[start:lastEnd], start, lastEnd)
+            start = lastEnd
+
+
+'''
+    if use_re:
+        temp = 'import re\n' + temp
+    return temp
 
-    parse = 'regex_list = ['
-    temp = regex_list
-    for regex in regex_list:
-        name = regex[0]
-        regex = regex_preformatter(regex[1])
-        # print(regex)
-        #return None
-        #print(regex)
-        parsed = rp.parse(name, regex, temp)
-        parse = parse + parsed + ','
-        temp = None
-
-    parse = parse[:-1]
-    #print(parse)
-
-    return parse + ']'
-        
-def readFile(fileName):
+def read_rules(fileName):
     regex = open(fileName, 'r')
-    temp = ""
-    temp_name = None
     regex_list = []
     for line in regex:
-       #print("LINE ",line)
-        for character in line:
-            if(character != " " and character != "\n"):
-                temp = temp + character
-            if(character == " " and temp_name is None):
-                temp_name = temp
-                temp = "("
-        temp_expr = temp + ')'
+        line = line.rstrip('\n')
+        if(line.strip() == ''):
+            continue
+        # token name, then the regex up to the end of the line
+        temp_name, temp_expr = line.lstrip().split(' ', 1)
         regex_list.append((temp_name, temp_expr))
-        temp = ""
-        temp_name = None
-
-    new = regex_formatter(regex_list)
-    #return None
-    generate_scanner(new)
+    return regex_list
+
+def readFile(fileName, compiled = False, use_re = False, cache = None):
+    regex_list = read_rules(fileName)
+
+    # named after the rule file so the name stays the same between runs
+    outName = "58090030_scanner_" + os.path.splitext(os.path.basename(fileName))[0] + ".py"
+    if cache is not None:
+        key = cache.key(GENERATOR_VERSION, regex_list, compiled, use_re, open(template_path, 'r').read())
+        cached = cache.get(key)
+        if cached is not None:
+            write_output(outName, cached)
+            print("Rules unchanged, " + outName + " is up to date")
+            return outName
+
+    new, table = regex_formatter(regex_list)
+    code = compiled_formatter(table, use_re) if compiled else None
+    generate_scanner(new, code, outName)
+    if cache is not None:
+        cache.put(key, open(outName, 'r').read())
+    return outName
     
-def generate_scanner(regex):
-
-    time = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-    fileName = "58090030_scanner_" + time+".py"
+def generate_scanner(regex, code = None, fileName = None):
 
-    automaton_template = "scanner_template.py"
+    if fileName is None:
+        time = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        fileName = "58090030_scanner_" + time+".py"
 
-    template = open(automaton_template, 'r')
-    out_file = open(fileName,'w')
+    template = open(template_path, 'r').read()
 
+    if code is not None:
+        # the compiled scan() goes after the library part of the template,
+        # replacing the table driven one
+        main = template.index("if __name__ == '__main__':")
+        template = template[:main] + code + template[main:]
     data_dump = regex
-    data_dump = data_dump + '\n\n' + template.read()
+    data_dump = data_dump + '\n\n' + template
 
-    out_file.write(data_dump)
-    out_file.close()
+    write_output(fileName, data_dump)
+    return fileName
 
 
 if __name__ == '__main__':
-    inp = input("Please enter file name (default is sampleRegex.txt press enter to assign default): ")
+    # python scanner_generator.py [regex file] [--compiled [--re]] [--no-cache]
+    options = [arg for arg in sys.argv[1:] if arg.startswith('--')]
+    files = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    if(len(files) > 0):
+        inp = files[0]
+    else:
+        inp = input("Please enter file name (default is sampleRegex.txt press enter to assign default): ")
     if(inp == ''):
         inp = "sampleRegex.txt"
-    readFile(inp)
+    cache = None if '--no-cache' in options else GenerationCache(cache_directory)
+    readFile(inp, '--compiled' in options, '--re' in options, cache)
@@ -1,143 +1,934 @@
 
 ########
 
+import codecs
+import json
+import sys
+from array import array
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
 class DFA:
     def __init__(self, Q, Sigma, delta, q0, F, type):
         self.name = type
         self.Q = Q  # set of states
-        self.Sigma = Sigma  # alphabet (set of input characters)
+        self.Sigma = Sigma  # alphabet (input characters, or the first character of each class)
         self.delta = delta  # transition function
         self.q0 = q0  # starting state
-        self.F = F  # set of accepting states
+        self.F = F  # accepting states mapped to their token name
+        # missing transitions go to 'err'
 
-        # add missing transitions
-        for q in Q:  # for each state
-            for c in Sigma:  # for each character
-                if (q, c) not in delta:
-                    delta[(q, c)] = 'err'
+        # states that can never reach an accepting state
+        self.dead = self.find_dead_states()
 
-    def accept(self, string):
+    def find_dead_states(self):
+        predecessors = dict()
+        for (q, c), next_state in self.delta.items():
+            predecessors.setdefault(next_state, set()).add(q)
+        live = set(self.F)
+        working_set = list(live)
+        while len(working_set) > 0:
+            q = working_set.pop()
+            for previous in predecessors.get(q, ()):
+                if previous not in live:
+                    live.add(previous)
+                    working_set.append(previous)
+        return set(q for q in self.Q if q not in live)
+
+    def accept(self, string, stats = None):
         # delta(delta(delta(delta(q0,s0),s1),s2),...) = q_last
         # if q_last is in F -> accept
         # otherwise -> reject
+        if stats is not None:
+            return self.accept_instrumented(string, stats)
+        q = self.q0
+        for c in string:
+            if q == 'err':
+                return False
+            q = self.delta.get((q, c), 'err')
+        return q in self.F
+
+    # accept() counting the states and transitions in stats (ScannerStats)
+    def accept_instrumented(self, string, stats):
         q = self.q0
+        stats.visit(q)
         for c in string:
             if q == 'err':
                 return False
-            q = self.delta[(q, c)]
+            next_state = self.delta.get((q, c), 'err')
+            stats.transition(q, c, next_state)
+            q = next_state
+            stats.visit(q)
+        stats.characters += len(string)
         return q in self.F
 
+    # Hopcroft partition refinement, returns an equivalent DFA with the
+    # fewest states. States accepting different tokens are never merged.
+    def minimize(self):
+        # in a fixed order, the numbering of the blocks follows from it
+        Sigma = sorted(self.Sigma)
+        states = list(self.Q) + ['err']
+        inverse = dict()
+        for q in states:
+            for c in Sigma:
+                next_state = self.delta.get((q, c), 'err')
+                inverse.setdefault((next_state, c), set()).add(q)
+
+        # initial partition: one block per token name plus the rejecting states
+        groups = dict()
+        for q in states:
+            groups.setdefault(self.F.get(q), set()).add(q)
+        blocks = list(groups.values())
+        block_of = dict()
+        for i, block in enumerate(blocks):
+            for q in block:
+                block_of[q] = i
+
+        working_set = set(range(len(blocks)))
+        while len(working_set) > 0:
+            splitter = blocks[working_set.pop()]
+            for c in Sigma:
+                X = set()
+                for q in splitter:
+                    X.update(inverse.get((q, c), ()))
+                touched = dict()
+                for q in X:
+                    touched.setdefault(block_of[q], set()).add(q)
+                for i, inside in touched.items():
+                    if len(inside) == len(blocks[i]):
+                        continue
+                    outside = blocks[i] - inside
+                    blocks[i] = inside
+                    blocks.append(outside)
+                    j = len(blocks) - 1
+                    for q in outside:
+                        block_of[q] = j
+                    if i in working_set:
+                        working_set.add(j)
+                    elif len(inside) <= len(outside):
+                        working_set.add(i)
+                    else:
+                        working_set.add(j)
+
+        # the block holding 'err' stays 'err', the others become 0, 1, 2, ...
+        names = dict()
+        count = 0
+        for i, block in enumerate(blocks):
+            if 'err' in block:
+                names[i] = 'err'
+            else:
+                names[i] = count
+                count += 1
+        Q_min = set(name for name in names.values() if name != 'err')
+        delta_min = dict()
+        F_min = dict()
+        for i, block in enumerate(blocks):
+            if names[i] == 'err':
+                continue
+            q = next(iter(block))
+            for c in Sigma:
+                next_state = names[block_of[self.delta.get((q, c), 'err')]]
+                if next_state != 'err':
+                    delta_min[(names[i], c)] = next_state
+            if q in self.F:
+                F_min[names[i]] = self.F[q]
+
+        return DFA(Q_min, self.Sigma, delta_min, names[block_of[self.q0]], F_min, self.name)
+
 class NFA:
     def __init__(self, Q, Sigma, delta, q0, F, type):
         self.name = type
         self.Q = Q  # set of states
-        self.Sigma = Sigma  # alphabet (set of input characters)
+        self.Sigma = Sigma  # alphabet (input characters, or the first character of each class)
         self.delta = delta  # transition function
         self.q0 = q0  # starting state
-        self.F = F  # set of accepting states
 
-        # add missing transitions
-        Q.add('err')
-        for q in Q:  # for each state
-            for c in Sigma:  # for each character
-                if (q, c) not in delta:
-                    delta[(q, c)] = {'err'}
+        # accepting states mapped to their token name; for a union of rules
+        # type is the list of token names ordered by priority
+        if isinstance(F, dict):
+            self.F = F
+        else:
+            self.F = {qf: type for qf in F}
+            type = [type]
+        # a name given to several rules ranks as the first of them
+        self.priority = dict()
+        for i, name in enumerate(type):
+            self.priority.setdefault(name, i)
+        # missing transitions lead nowhere
+
+        # empty string closure of every state, computed once
+        self.closures = self.compute_closures()
+
+    # Tarjan's strongly connected components over the empty string
+    # transitions. States of one component share the same closure, and a
+    # component is finished only after every component it reaches, so its
+    # closure is its own states plus the already known closures after it.
+    def compute_closures(self):
+        closures = dict()
+        index = dict()
+        lowlink = dict()
+        component_stack = []
+        on_stack = set()
+
+        for root in self.Q:
+            if root in index:
+                continue
+            call_stack = [(root, iter(self.delta.get((root, ''), ())))]
+            index[root] = lowlink[root] = len(index)
+            component_stack.append(root)
+            on_stack.add(root)
+            while len(call_stack) > 0:
+                q, successors = call_stack[-1]
+                descended = False
+                for next_state in successors:
+                    if next_state not in index:
+                        index[next_state] = lowlink[next_state] = len(index)
+                        component_stack.append(next_state)
+                        on_stack.add(next_state)
+                        call_stack.append((next_state, iter(self.delta.get((next_state, ''), ()))))
+                        descended = True
+                        break
+                    elif next_state in on_stack:
+                        lowlink[q] = min(lowlink[q], index[next_state])
+                if descended:
+                    continue
+
+                call_stack.pop()
+                if len(call_stack) > 0:
+                    parent = call_stack[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[q])
+                if lowlink[q] == index[q]:
+                    component = []
+                    while True:
+                        member = component_stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == q:
+                            break
+                    reached = set(component)
+                    for member in component:
+                        for next_state in self.delta.get((member, ''), ()):
+                            if next_state in closures:
+                                reached.update(closures[next_state])
+                    reached = frozenset(reached)
+                    for member in component:
+                        closures[member] = reached
+        return closures
 
     def closure(self, q):
-        working_set = {q}
-        reached = set()
-        while len(working_set) > 0:
-            q = working_set.pop()
-            reached.add(q)
+        return self.closures[q]
 
-            # if there is an empty string transition
-            if (q, '') in self.delta:
-                # add all next state candidates to the working set if they are not reached
-                working_set = working_set.union(
-                    {next_state for next_state in self.delta[(q, '')] if next_state not in reached})
-        return reached
+    def move(self, current_states, c):
+        # closure of every state reached from current_states on c
+        next_states = set()  # possible next state
+        for q in current_states:
+            # delta(state, c) -> set of states
+            for next_state in self.delta.get((q, c), ()):
+                next_states.update(self.closures[next_state])
+        return next_states
 
     def accept(self, string):
         current_states = self.closure(self.q0)  # start from closure of the starting state
         for c in string:
-            next_states = set()  # possible next state
-            for q in current_states:
-                # delta(state, c) -> set of states
-                for next_state in self.delta[(q, c)]:
-                    closure_next_state = self.closure(next_state)
-                    next_states = next_states.union(closure_next_state)
-            current_states = next_states
+            current_states = self.move(current_states, c)
         return any(q in self.F for q in current_states)
 
+    # Sets of NFA states as Python ints: bit i stands for state i of
+    # self.order. For each character, moves[c][i] is the closure of every
+    # state reached from state i on c, so a DFA transition is an OR of masks.
+    def bitsets(self):
+        order = sorted(self.Q)
+        bit = {q: i for i, q in enumerate(order)}
+
+        closure_masks = []
+        for q in order:
+            mask = 0
+            for reached in self.closures[q]:
+                mask |= 1 << bit[reached]
+            closure_masks.append(mask)
+
+        moves = dict()
+        for c in self.Sigma:
+            masks = []
+            for q in order:
+                mask = 0
+                for next_state in self.delta.get((q, c), ()):
+                    mask |= closure_masks[bit[next_state]]
+                masks.append(mask)
+            moves[c] = masks
+
+        # accepting masks per token, highest priority first
+        accept_masks = dict()
+        for qf, name in self.F.items():
+            accept_masks[name] = accept_masks.get(name, 0) | (1 << bit[qf])
+        accept_masks = sorted(accept_masks.items(), key=lambda item: self.priority[item[0]])
+
+        return closure_masks[bit[self.q0]], moves, accept_masks
+
     # NFA to DFA
     def convert_to_DFA(self):
-        Q_DFA = set()
+        start, moves, accept_masks = self.bitsets()
+        Sigma = sorted(self.Sigma)
         delta_DFA = dict()
 
-        q0_DFA = tuple(sorted(list(self.closure(self.q0))))
-
-        working_set = {q0_DFA}
+        # DFA states are numbered 0, 1, 2, ... in the order they are found;
+        # the empty set is left out, missing transitions go to 'err'
+        number = {start: 0}
+        working_set = [start]
         while len(working_set) > 0:
             current_states = working_set.pop()
-            Q_DFA.add(current_states)
-            for c in self.Sigma:
-                next_states = set()  # possible next state
-                for q in current_states:
-                    # delta(state, c) -> set of states
-                    for next_state in self.delta[(q, c)]:
-                        closure_next_state = self.closure(next_state)
-                        next_states = next_states.union(closure_next_state)
-                newstate = tuple(sorted([s for s in next_states if s != 'err']))
-                if newstate not in Q_DFA:
-                    working_set.add(newstate)
-                delta_DFA[(current_states, c)] = newstate
-
-        F_DFA = set(q for q in Q_DFA if any(qf in q for qf in self.F))
-
-        return DFA(Q_DFA, self.Sigma, delta_DFA, q0_DFA, F_DFA, self.name)
-
-def tokenize(input_string, DFA_list):
-    token = []
-    temp = ""
-    lastAccept = None
-    count = 0
-    proceed = True
-    while(count != len(input_string)):
-        temp = temp + input_string[count]
-        #print(count)
-        #print(temp)
-        for DFA in DFA_list:
-            try:
-                if(DFA.accept(temp)):
-                    lastAccept = DFA.name
-                    proceed = True
+            q = number[current_states]
+            for c in Sigma:
+                masks = moves[c]
+                next_states = 0
+                rest = current_states
+                while rest:
+                    low = rest & -rest
+                    next_states |= masks[low.bit_length() - 1]
+                    rest ^= low
+                if next_states == 0:
+                    continue
+                if next_states not in number:
+                    number[next_states] = len(number)
+                    working_set.append(next_states)
+                delta_DFA[(q, c)] = number[next_states]
+
+        # a DFA state accepting several rules returns the first one listed
+        F_DFA = dict()
+        for states, q in number.items():
+            for name, mask in accept_masks:
+                if states & mask:
+                    F_DFA[q] = name
                     break
+
+        return DFA(set(number.values()), self.Sigma, delta_DFA, 0, F_DFA, self.name)
+
+# Dense form of a DFA for the tokenizer. Characters are mapped to classes
+# (characters with the same column in the transition table share a class)
+# and the next state of row q on class c is transitions[q * num_classes + c].
+# -1 means no accepting state is reachable anymore.
+class ScannerTable:
+    def __init__(self, classes, default, transitions, accept, names, start = 0):
+        self.classes = classes  # character -> class index, -1 if it can't be read
+        self.default = default  # class of the characters not in classes
+        self.transitions = transitions  # array('i') of num_states * num_classes
+        self.accept = accept  # array('i') of token index per state, -1 if not accepting
+        self.num_classes = len(transitions) // len(accept)
+        self.names = names  # token names ordered by priority
+        self.start = start
+
+    # plain data for the generated scanner, see load()
+    def dump(self):
+        grouped = dict()
+        for character, c in self.classes.items():
+            grouped[c] = grouped.get(c, '') + character
+        return [grouped, self.default, tuple(self.transitions), tuple(self.accept), self.names]
+
+    @staticmethod
+    def load(data):
+        grouped, default, transitions, accept, names = data
+        classes = {character: c for c, chars in grouped.items() for character in chars}
+        return ScannerTable(classes, default, array('i', transitions), array('i', accept), names)
+
+    # char_classes maps each symbol of the DFA to the characters it stands
+    # for (see regexParser.alphabet_classes), default is the symbol of every
+    # other character. Without it each symbol is a character.
+    @staticmethod
+    def from_DFA(dfa, char_classes = None, default = None):
+        # live states only, renumbered with the start state first
+        states = [dfa.q0] + sorted((q for q in dfa.Q if q not in dfa.dead and q != dfa.q0))
+        row = {q: i for i, q in enumerate(states)}
+
+        def target(q, c):
+            next_state = dfa.delta.get((q, c), 'err')
+            return row.get(next_state, -1)
+
+        # symbols with identical columns end up in the same class
+        column_class = dict()
+        symbol_class = dict()
+        for c in sorted(dfa.Sigma):
+            column = tuple(target(q, c) for q in states)
+            if all(next_state == -1 for next_state in column):
+                symbol_class[c] = -1
+                continue
+            if column not in column_class:
+                column_class[column] = len(column_class)
+            symbol_class[c] = column_class[column]
+
+        if char_classes is None:
+            char_classes = {c: c for c in dfa.Sigma}
+        classes = dict()
+        for symbol, chars in char_classes.items():
+            for character in chars:
+                classes[character] = symbol_class.get(symbol, -1)
+        default = symbol_class.get(default, -1)
+
+        transitions = array('i', [-1]) * (len(states) * len(column_class))
+        for column, c in column_class.items():
+            for q, next_state in enumerate(column):
+                transitions[q * len(column_class) + c] = next_state
+
+        names = list(dfa.name) if isinstance(dfa.name, list) else [dfa.name]
+        accept = array('i', [-1]) * len(states)
+        for q in states:
+            if q in dfa.F:
+                accept[row[q]] = names.index(dfa.F[q])
+
+        return ScannerTable(classes, default, transitions, accept, names)
+
+    # Pairs of classes (x, y) such that no token can hold the two characters
+    # next to each other: reading x from any state leaves a state with no
+    # transition on y. Maximal munch then always ends a token between them,
+    # whatever came before, which makes it a safe place to split the input.
+    def safe_pairs(self):
+        num_classes = self.num_classes
+        num_states = len(self.accept)
+        pairs = set()
+        for x in range(num_classes):
+            after_x = set()
+            for q in range(num_states):
+                next_state = self.transitions[q * num_classes + x]
+                if next_state >= 0:
+                    after_x.add(next_state)
+            for y in range(num_classes):
+                if all(self.transitions[q * num_classes + y] < 0 for q in after_x):
+                    pairs.add((x, y))
+        return pairs
+
+# DFA built on the fly from the NFA: a DFA state (a bitset of NFA states,
+# see NFA.bitsets) is only made when the tokenizer first reaches it. A
+# state is a list holding, for each symbol, the next state itself (None
+# until that transition is first taken, DEAD when no NFA state is left),
+# followed by its token name, its bitset and the transitions into it. Once
+# made, a transition costs one list index, as in a ScannerTable.
+# At most max_states states are kept besides the start state. The order of
+# eviction is kept on misses only: a state moves to the back when a new
+# transition is made from it or into it, the one at the front goes first
+# and the transitions into it are cut. If the cache keeps missing after it
+# has been filled over, tokenizing goes on as a plain NFA simulation
+# without caching anything.
+DEAD = []
+
+class LazyDFA:
+    def __init__(self, nfa, char_classes = None, default = None, max_states = 10000):
+        self.start, moves, self.accept_masks = nfa.bitsets()
+        if char_classes is None:
+            char_classes = {c: c for c in nfa.Sigma}
+        symbols = sorted(char_classes)
+        self.classes = dict()  # character -> symbol index
+        for i, symbol in enumerate(symbols):
+            for character in char_classes[symbol]:
+                self.classes[character] = i
+        self.default = symbols.index(default) if default in char_classes else -1
+        self.moves = [moves.get(symbol) for symbol in symbols]
+        self.num_symbols = len(symbols)
+        self.max_states = max_states
+        self.cache = OrderedDict()  # bitset -> state, next to be evicted first
+        self.start_state = self.new_state(self.start)
+        self.steps = 0
+        self.misses = 0
+        self.evictions = 0
+        self.simulating = False
+        self.numbers = dict()  # bitset -> state number, for ScannerStats
+
+    def token_of(self, states):
+        for name, mask in self.accept_masks:
+            if states & mask:
+                return name
+        return None
+
+    def next_states(self, states, c):
+        masks = self.moves[c]
+        if masks is None:
+            return 0
+        next_states = 0
+        while states:
+            low = states & -states
+            next_states |= masks[low.bit_length() - 1]
+            states ^= low
+        return next_states
+
+    def new_state(self, states):
+        # incoming maps (id of a state, symbol) to that state, for eviction
+        return [None] * self.num_symbols + [self.token_of(states), states, dict()]
+
+    # The state after state on symbol c, which had no transition yet
+    def miss(self, state, c):
+        n = self.num_symbols
+        states = self.next_states(state[n + 1], c)
+        if states == 0:
+            state[c] = DEAD
+            return DEAD
+        if self.simulating:
+            # the cache was dropped in this token, finish it without one
+            return self.new_state(states)
+        if state[n + 1] in self.cache:
+            self.cache.move_to_end(state[n + 1])
+        if states == self.start:
+            target = self.start_state
+        else:
+            target = self.cache.get(states)
+            if target is None:
+                self.misses += 1
+                target = self.new_state(states)
+                self.cache[states] = target
+                if len(self.cache) > self.max_states:
+                    self.evict()
+            else:
+                self.cache.move_to_end(states)
+        state[c] = target
+        target[n + 2][(id(state), c)] = state
+        return target
+
+    def evict(self):
+        n = self.num_symbols
+        states, state = self.cache.popitem(last = False)
+        for previous in state[n + 2].values():
+            for c in range(n):
+                if previous[c] is state:
+                    previous[c] = None
+        for c in range(n):
+            target = state[c]
+            if target is not None and target is not DEAD:
+                target[n + 2].pop((id(state), c), None)
+            state[c] = None
+        state[n + 2].clear()
+        self.evictions += 1
+        if self.evictions >= self.max_states:
+            # the whole cache was replaced, give up on it if more than
+            # one character in ten had to make a state
+            if self.misses * 10 > self.steps:
+                self.simulating = True
+                self.cache.clear()
+                self.start_state = self.new_state(self.start)
+            self.steps = self.misses = self.evictions = 0
+
+    def scan(self, input_string, start = 0, final = True):
+        if self.simulating:
+            yield from self.simulate(input_string, start, final)
+            return
+        classes = self.classes
+        default = self.default
+        token_index = self.num_symbols
+        length = len(input_string)
+        while start < length:
+            if self.simulating:
+                yield from self.simulate(input_string, start, final)
+                return
+            state = self.start_state
+            lastAccept = None
+            lastEnd = start
+            count = start
+            while count < length:
+                c = classes.get(input_string[count], default)
+                if c < 0:
+                    break
+                next_state = state[c]
+                if next_state is None:
+                    next_state = self.miss(state, c)
+                if next_state is DEAD:
+                    break
+                state = next_state
+                count += 1
+                if state[token_index] is not None:
+                    lastAccept = state[token_index]
+                    lastEnd = count
+            else:
+                if not final:
+                    # the token may go on in the text that comes next
+                    return
+            self.steps += count - start + 1
+
+            if lastAccept is None:
+                # no rule matches here, report the single character and move on
+                yield (None, input_string[start], start, start + 1)
+                start += 1
+            else:
+                yield (lastAccept, input_string[start:lastEnd], start, lastEnd)
+                start = lastEnd
+
+    # scan() counting what it does in stats, a ScannerStats, as
+    # scan_instrumented() does for a ScannerTable. States are numbered in
+    # the order they are first counted, evicted ones keep their number.
+    def scan_instrumented(self, input_string, stats, start = 0, final = True):
+        classes = self.classes
+        default = self.default
+        n = self.num_symbols
+        numbers = self.numbers
+        length = len(input_string)
+        while start < length:
+            # without a cache the bitsets are followed by themselves
+            state = None if self.simulating else self.start_state
+            states = self.start
+            path = []
+            lastAccept = None
+            lastEnd = start
+            count = start
+            while count < length:
+                c = classes.get(input_string[count], default)
+                if c < 0:
+                    break
+                if state is None:
+                    next_states = self.next_states(states, c)
+                    if next_states == 0:
+                        break
+                    token = self.token_of(next_states)
                 else:
-                    proceed = False
-            except(KeyError):
-                pass
-            
-        if(proceed == False and lastAccept is not None):
-            token.append((lastAccept, temp[:-1]))
-            temp = ""
+                    next_state = state[c]
+                    if next_state is None:
+                        next_state = self.miss(state, c)
+                    if next_state is DEAD:
+                        break
+                    state = next_state
+                    next_states = state[n + 1]
+                    token = state[n]
+                path.append((states, c, next_states))
+                states = next_states
+                count += 1
+                if token is not None:
+                    lastAccept = token
+                    lastEnd = count
+            else:
+                if not final:
+                    return
+            self.steps += count - start + 1
+
+            stats.visit(numbers.setdefault(self.start, len(numbers)))
+            for states, c, next_states in path:
+                q = numbers.setdefault(states, len(numbers))
+                next_state = numbers.setdefault(next_states, len(numbers))
+                stats.transition(q, c, next_state)
+                stats.visit(next_state)
+            if lastAccept is None:
+                stats.token(None, max(count - start - 1, 0))
+                stats.characters += 1
+                yield (None, input_string[start], start, start + 1)
+                start += 1
+            else:
+                stats.token(lastAccept, count - lastEnd)
+                stats.characters += lastEnd - start
+                yield (lastAccept, input_string[start:lastEnd], start, lastEnd)
+                start = lastEnd
+
+    # scan() over the NFA bitsets, nothing kept
+    def simulate(self, input_string, start = 0, final = True):
+        classes = self.classes
+        default = self.default
+        length = len(input_string)
+        while start < length:
+            states = self.start
             lastAccept = None
-            proceed = True
+            lastEnd = start
+            count = start
+            while count < length:
+                c = classes.get(input_string[count], default)
+                if c < 0:
+                    break
+                states = self.next_states(states, c)
+                if states == 0:
+                    break
+                count += 1
+                token = self.token_of(states)
+                if token is not None:
+                    lastAccept = token
+                    lastEnd = count
+            else:
+                if not final:
+                    return
+
+            if lastAccept is None:
+                yield (None, input_string[start], start, start + 1)
+                start += 1
+            else:
+                yield (lastAccept, input_string[start:lastEnd], start, lastEnd)
+                start = lastEnd
+
+def scan(input_string, table, start = 0, final = True):
+    # maximal munch: walk the DFA over the input once, remember the last
+    # position where it accepted and restart from there. With final False
+    # the input is only a prefix: scanning stops before a token that reaches
+    # the end of input_string, the caller resumes there with more text.
+    if isinstance(table, LazyDFA):
+        yield from table.scan(input_string, start, final)
+        return
+    classes = table.classes
+    default = table.default
+    transitions = table.transitions
+    num_classes = table.num_classes
+    accept = table.accept
+    names = table.names
+    length = len(input_string)
+    while start < length:
+        q = table.start
+        lastAccept = -1
+        lastEnd = start
+        count = start
+        while count < length:
+            c = classes.get(input_string[count], default)
+            if c < 0:
+                break
+            q = transitions[q * num_classes + c]
+            if q < 0:
+                break
+            count += 1
+            if accept[q] >= 0:
+                lastAccept = accept[q]
+                lastEnd = count
         else:
+            if not final:
+                # the token may go on in the text that comes next
+                return
+
+        if lastAccept < 0:
+            # no rule matches here, report the single character and move on
+            yield (None, input_string[start], start, start + 1)
+            start += 1
+        else:
+            yield (names[lastAccept], input_string[start:lastEnd], start, lastEnd)
+            start = lastEnd
+
+# scan() counting what it does in stats, a ScannerStats: the states it goes
+# through, the transitions it takes and how far it reads past the end of
+# each token before backing up to it. Kept apart from scan() so a scanner
+# that isn't being measured doesn't pay for the counters.
+def scan_instrumented(input_string, table, stats, start = 0, final = True):
+    if isinstance(table, LazyDFA):
+        yield from table.scan_instrumented(input_string, stats, start, final)
+        return
+    classes = table.classes
+    default = table.default
+    transitions = table.transitions
+    num_classes = table.num_classes
+    accept = table.accept
+    names = table.names
+    length = len(input_string)
+    while start < length:
+        q = table.start
+        # counted once the token is out, a token left for the next chunk
+        # of a stream is scanned again there
+        path = []
+        lastAccept = -1
+        lastEnd = start
+        count = start
+        while count < length:
+            c = classes.get(input_string[count], default)
+            if c < 0:
+                break
+            next_state = transitions[q * num_classes + c]
+            if next_state < 0:
+                break
+            path.append((q, c, next_state))
+            q = next_state
             count += 1
+            if accept[q] >= 0:
+                lastAccept = accept[q]
+                lastEnd = count
+        else:
+            if not final:
+                return
+
+        stats.visit(table.start)
+        for q, c, next_state in path:
+            stats.transition(q, c, next_state)
+            stats.visit(next_state)
+        if lastAccept < 0:
+            stats.token(None, max(count - start - 1, 0))
+            stats.characters += 1
+            yield (None, input_string[start], start, start + 1)
+            start += 1
+        else:
+            stats.token(names[lastAccept], count - lastEnd)
+            stats.characters += lastEnd - start
+            yield (names[lastAccept], input_string[start:lastEnd], start, lastEnd)
+            start = lastEnd
+
+# Counters for scan_instrumented() and DFA.accept(..., stats), written out
+# with to_json(). States and symbols are the table's: class indexes for a
+# ScannerTable or symbol indexes for a LazyDFA (pass the table to to_json()
+# to see their characters), characters or class names for a DFA.
+class ScannerStats:
+    def __init__(self):
+        self.state_visits = dict()  # state -> times entered
+        self.transitions = dict()  # (state, symbol, next state) -> times taken
+        self.backtracks = dict()  # characters read past the token end -> tokens
+        self.tokens = dict()  # token name -> count, None for unmatched characters
+        self.characters = 0
+
+    def visit(self, q):
+        self.state_visits[q] = self.state_visits.get(q, 0) + 1
+
+    def transition(self, q, c, next_state):
+        key = (q, c, next_state)
+        self.transitions[key] = self.transitions.get(key, 0) + 1
+
+    def token(self, name, backtrack):
+        self.tokens[name] = self.tokens.get(name, 0) + 1
+        self.backtracks[backtrack] = self.backtracks.get(backtrack, 0) + 1
+
+    def to_dict(self, table = None):
+        symbols = dict()
+        if isinstance(table, (ScannerTable, LazyDFA)):
+            for character, c in sorted(table.classes.items()):
+                symbols[c] = symbols.get(c, '') + character
+
+        # hottest first, which is the order worth laying a table out in
+        def by_count(counts):
+            return sorted(counts.items(), key = lambda item: (-item[1], str(item[0])))
+
+        return {
+            'characters': self.characters,
+            'tokens': {str(name): count for name, count in by_count(self.tokens)},
+            'state_visits': [{'state': q, 'count': count} for q, count in by_count(self.state_visits)],
+            'transitions': [{'from': q, 'symbol': symbols.get(c, c), 'to': next_state, 'count': count}
+                            for (q, c, next_state), count in by_count(self.transitions)],
+            'backtracks': {str(length): self.backtracks[length] for length in sorted(self.backtracks)},
+            'max_backtrack': max(self.backtracks, default = 0),
+        }
+
+    def to_json(self, table = None):
+        return json.dumps(self.to_dict(table), indent = 1)
 
-    token.append((lastAccept, temp))
-    return token
+def tokenize(input_string, table, stats = None):
+    if stats is not None:
+        tokens = scan_instrumented(input_string, table, stats)
+    else:
+        tokens = scan(input_string, table)
+    return [(name, lexeme) for name, lexeme, start, end in tokens]
+
+# Tokenize a file object or mmap without reading it whole: text is read
+# chunk_size at a time (bytes are decoded as encoding) and only the part
+# from the start of the current token is kept. Yields
+# (name, lexeme, start, end, line, column), line and column counted from 1.
+# With stats (a ScannerStats) the chunks go through scan_instrumented().
+def scan_stream(source, table, chunk_size = 65536, encoding = 'utf-8', stats = None):
+    decoder = None
+    buffer = ''
+    offset = 0  # position of buffer[0] in the whole input
+    line = 1
+    column = 1
+    final = False
+    while not final:
+        chunk = source.read(chunk_size)
+        final = len(chunk) == 0
+        if isinstance(chunk, bytes):
+            if decoder is None:
+                decoder = codecs.getincrementaldecoder(encoding)()
+            chunk = decoder.decode(chunk, final)
+        buffer = buffer + chunk
+
+        position = 0
+        if stats is not None:
+            tokens = scan_instrumented(buffer, table, stats, 0, final)
+        else:
+            tokens = scan(buffer, table, 0, final)
+        for name, lexeme, start, end in tokens:
+            yield (name, lexeme, offset + start, offset + end, line, column)
+            newlines = lexeme.count('\n')
+            if newlines > 0:
+                line += newlines
+                column = len(lexeme) - lexeme.rfind('\n')
+            else:
+                column += len(lexeme)
+            position = end
+        buffer = buffer[position:]
+        offset += position
+
+# Split input_string into about chunk_size long pieces at safe places (see
+# ScannerTable.safe_pairs), scan the pieces in a process pool and give back
+# the tokens in order with offsets into the whole string. Each worker gets
+# the table once, when it starts.
+def scan_parallel(input_string, table, workers = None, chunk_size = 1 << 20):
+    if not isinstance(table, ScannerTable) or len(input_string) <= chunk_size:
+        yield from scan(input_string, table)
+        return
+
+    classes = table.classes
+    default = table.default
+    safe = table.safe_pairs()
+    pieces = []
+    start = 0
+    while start < len(input_string):
+        end = start + chunk_size
+        while end < len(input_string):
+            x = classes.get(input_string[end - 1], default)
+            y = classes.get(input_string[end], default)
+            if x < 0 or y < 0 or (x, y) in safe:
+                break
+            end += 1
+        pieces.append((input_string[start:end], start))
+        start = end
+
+    # workers send back only token numbers and end offsets, the lexemes
+    # are cut from input_string here
+    names = table.names
+    with ProcessPoolExecutor(workers, initializer = init_worker, initargs = (table,)) as executor:
+        for (text, offset), (tokens, ends) in zip(pieces, executor.map(scan_piece, pieces)):
+            start = offset
+            for token, end in zip(tokens, ends):
+                end += offset
+                if token < 0:
+                    yield (None, input_string[start:end], start, end)
+                else:
+                    yield (names[token], input_string[start:end], start, end)
+                start = end
+
+worker_table = None
+
+def init_worker(table):
+    global worker_table
+    worker_table = table
+
+def scan_piece(piece):
+    text, offset = piece
+    number = {name: i for i, name in enumerate(worker_table.names)}
+    tokens = array('i')
+    ends = array('i')
+    for name, lexeme, start, end in scan(text, worker_table):
+        tokens.append(number.get(name, -1))
+        ends.append(end)
+    return tokens, ends
 
 if __name__ == '__main__':
 
     print("REGEX Rules: ",end = "")
+    print(*scanner_table_data[4])
+
+    options = [arg for arg in sys.argv[1:] if arg.startswith('--')]
+    files = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    if '--lazy' in options:
+        # build DFA states only when the input reaches them
+        nfa_data = scanner_nfa()
+        nfa = NFA(nfa_data[0],nfa_data[1],nfa_data[2],nfa_data[3],nfa_data[4],nfa_data[5])
+        scanner_table = LazyDFA(nfa, nfa_data[6], nfa_data[7])
+    else:
+        # determinized and minimized by the scanner generator
+        scanner_table = ScannerTable.load(scanner_table_data)
 
-    DFA_list = []
+    # --stats=file.json writes what the scanner did with the files to it
+    stats = None
+    for option in options:
+        if option.startswith('--stats='):
+            statsName = option[len('--stats='):]
+            stats = ScannerStats()
+    if stats is not None and '--parallel' in options:
+        sys.exit('--stats is not kept with --parallel, the parts are tokenized in other processes')
 
-    for each_regex in regex_list:
-        temp = NFA(each_regex[0],each_regex[1],each_regex[2],each_regex[3],each_regex[4],each_regex[5])
-        DFA_list.append(temp.convert_to_DFA())
-        print(each_regex[5], end = " ")
+    if len(files) > 0:
+        # tokenize whole files, one token per line
+        for fileName in files:
+            if '--parallel' in options:
+                with open(fileName, 'r') as source:
+                    tokens = scan_parallel(source.read(), scanner_table)
+                    for token in tokens:
+                        print(token)
+            else:
+                with open(fileName, 'rb') as source:
+                    for token in scan_stream(source, scanner_table, stats = stats):
+                        print(token)
+        if stats is not None:
+            with open(statsName, 'w') as stats_file:
+                stats_file.write(stats.to_json(scanner_table))
+        sys.exit()
 
     while(True):
         inp = input("\nPlease enter string to tokenize: ")
@@ -145,7 +936,7 @@ if __name__ == '__main__':
         temp = []
         print()
         for sets in inp:
-            temp = temp + tokenize(sets, DFA_list)
+            temp = temp + tokenize(sets, scanner_table)
         print(temp)
 
     #'aabab ba aaaaababababbabacacbabababababacacacacacababababbabacabab'
@@ -0,0 +1,261 @@
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+
+# python benchmark.py [--quick] [--output=results.json]
+# Times the scanner and parser generators phase by phase on the sample
+# files and on generated specs of growing size, then the generated
+# scanners and parsers on synthetic inputs of growing size. Everything is
+# reported as one JSON document: ms for times, MB for the peak memory of a
+# whole generation (measured in a separate run, tracemalloc slows it down).
+
+here = os.path.dirname(os.path.abspath(__file__))
+scanner_dir = os.path.join(here, 'Scanner Generator')
+parser_dir = os.path.join(here, 'LR1 Parser Generator')
+sys.path.insert(0, scanner_dir)
+sys.path.insert(0, parser_dir)
+
+import regexParser as rp
+import scanner_template as st
+import scanner_generator
+from first_follow_generator import FirstFollowGenerator
+from lr1_itemset_table_gen import Itemset_LR1, Itemset_LALR1, ParsingTable, MainLR1gen
+import lr1_parser_generator
+
+
+def timed(function, *args):
+    # (result, ms) of one call, the generators print a lot so stdout goes away
+    with contextlib.redirect_stdout(io.StringIO()):
+        begin = time.perf_counter()
+        result = function(*args)
+        end = time.perf_counter()
+    return result, (end - begin) * 1000
+
+def best_of(repeat, function, *args):
+    times = [timed(function, *args)[1] for i in range(repeat)]
+    return min(times)
+
+def peak_mb(function, *args):
+    tracemalloc.start()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            function(*args)
+        return tracemalloc.get_traced_memory()[1] / (1 << 20)
+    finally:
+        tracemalloc.stop()
+
+def git_version():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd = here,
+                                       stderr = subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# ---- scanner ----
+
+def keyword_rules(count):
+    # count keywords ahead of the usual identifier, number and blank rules
+    random.seed(count)
+    keywords = set()
+    while len(keywords) < count:
+        keywords.add(''.join(random.choice('abcdefghijklmnopqrstuvwxyz') for i in range(random.randint(2, 8))))
+    rules = [('t_kw' + str(i), keyword) for i, keyword in enumerate(sorted(keywords))]
+    return rules + [('t_id', '[a-zA-Z_][a-zA-Z_0-9]*'), ('t_num', '\\d+(\\.\\d+)?'),
+                    ('t_op', '[-+*/=<>]=?|[(){};,]'), ('t_ws', '[ \\t\\n]+')]
+
+def scanner_generation(name, regex_list):
+    result = {'spec': name, 'rules': len(regex_list)}
+
+    # the two steps of rp.union()
+    trees, result['parse_ms'] = timed(rp.parse_rules, regex_list)
+    nfa_data, result['thompson_ms'] = timed(rp.build_nfa, trees)
+    nfa = st.NFA(*nfa_data[:6])
+    result['nfa_states'] = len(nfa_data[0])
+    result['nfa_transitions'] = sum(len(targets) for targets in nfa_data[2].values())
+    result['alphabet_classes'] = len(nfa_data[6])
+
+    dfa, result['convert_to_DFA_ms'] = timed(nfa.convert_to_DFA)
+    result['dfa_states'] = len(dfa.Q)
+    result['dfa_transitions'] = len(dfa.delta)
+    minimal, result['minimize_ms'] = timed(dfa.minimize)
+    result['minimal_states'] = len(minimal.Q)
+    table, result['table_ms'] = timed(st.ScannerTable.from_DFA, minimal, nfa_data[6], nfa_data[7])
+    result['table_states'] = len(table.accept)
+    result['table_classes'] = table.num_classes
+    code, result['compile_ms'] = timed(scanner_generator.compiled_formatter, table)
+
+    result['total_ms'] = (result['parse_ms'] + result['thompson_ms'] + result['convert_to_DFA_ms']
+                          + result['minimize_ms'] + result['table_ms'])
+    result['peak_mb'] = peak_mb(scanner_generator.regex_formatter, regex_list)
+    return result, table
+
+def compiled_scan(table, use_re = False):
+    # scan() of the compiled mode, run in a copy of the template module
+    namespace = dict(vars(st))
+    exec(scanner_generator.compiled_formatter(table, use_re), namespace)
+    return namespace['scan']
+
+def scanner_input(size):
+    random.seed(size)
+    words = ['if', 'x', 'count', 'total_value', 'i', 'while_loop', 'a1b2']
+    out = []
+    length = 0
+    while length < size:
+        if random.random() < 0.1:
+            piece = '// ' + ' '.join(random.choice(words) for i in range(6)) + '\n'
+        else:
+            piece = ' '.join([random.choice(words), random.choice(['=', '+', '<=', '(', ')', ';']),
+                              str(random.randint(0, 99999)), random.choice(words)]) + ';\n'
+        out.append(piece)
+        length += len(piece)
+    return ''.join(out)[:size]
+
+def scanner_runtime(sizes, repeat):
+    regex_list = [('t_if', 'if'), ('t_id', '[a-zA-Z_][a-zA-Z_0-9]*'), ('t_num', '\\d+(\\.\\d+)?'),
+                  ('t_comment', '//[^\\n]*'), ('t_ws', '[ \\t\\n]+'), ('t_op', '[-+*/=<>!]=?|[(){};,]')]
+    with contextlib.redirect_stdout(io.StringIO()):
+        header, table = scanner_generator.regex_formatter(regex_list)
+        nfa_data = rp.union(regex_list)
+    scanners = [('table', st.scan), ('compiled', compiled_scan(table)), ('compiled_re', compiled_scan(table, True))]
+
+    results = []
+    for size in sizes:
+        text = scanner_input(size)
+        tokens = sum(1 for token in st.scan(text, table))
+        for mode, scan in scanners:
+            ms = best_of(repeat, lambda: sum(1 for token in scan(text, table)))
+            results.append({'mode': mode, 'chars': size, 'tokens': tokens, 'ms': ms,
+                            'chars_per_s': size / ms * 1000})
+        lazy = st.LazyDFA(st.NFA(*nfa_data[:6]), nfa_data[6], nfa_data[7])
+        ms = best_of(1, lambda: sum(1 for token in st.scan(text, lazy)))
+        results.append({'mode': 'lazy', 'chars': size, 'tokens': tokens, 'ms': ms,
+                        'chars_per_s': size / ms * 1000, 'lazy_states': len(lazy.cache) + 1})
+    return results
+
+
+# ---- parser ----
+
+def expression_grammar(levels):
+    # one nonterminal per precedence level, E0 the loosest:
+    # Ei -> Ei op_i Ei+1 | Ei+1, and the last one -> ( E0 ) | id
+    non_terminal = ["S'"] + ['E' + str(i) for i in range(levels + 1)]
+    terminal = ['t_op' + str(i) for i in range(levels)] + ['t_lp', 't_rp', 't_id']
+    rules = [["S'", 'E0']]
+    for i in range(levels):
+        rules.append(['E' + str(i), 'E' + str(i), 't_op' + str(i), 'E' + str(i + 1)])
+        rules.append(['E' + str(i), 'E' + str(i + 1)])
+    rules.append(['E' + str(levels), 't_lp', 'E0', 't_rp'])
+    rules.append(['E' + str(levels), 't_id'])
+    return non_terminal, terminal, rules
+
+def build_parsing_table(non_terminal, terminal, rules, lalr, precedence = None, rule_precedence = None):
+    generator = MainLR1gen()
+    generator.generateParsingTable(non_terminal, terminal, rules, lalr, None, precedence, rule_precedence)
+    return generator.table_data
+
+# the steps of MainLR1gen.generateParsingTable() one by one
+def parser_generation(name, non_terminal, terminal, rules, precedence, rule_precedence, lalr):
+    result = {'spec': name, 'lalr': lalr, 'rules': len(rules)}
+    ff, result['first_follow_ms'] = timed(FirstFollowGenerator, non_terminal, terminal, rules)
+    lr1, result['itemsets_ms'] = timed(Itemset_LR1, non_terminal, terminal, rules, ff)
+    result['lr1_states'] = lr1.getID()
+    if lalr:
+        lr1, result['lalr_ms'] = timed(Itemset_LALR1, lr1)
+    result['states'] = lr1.getID()
+    result['items'] = sum(len(item.getItems()) for item in lr1.getItems())
+    result['transitions'] = len(lr1.getTransitions())
+
+    pt = ParsingTable(non_terminal, list(terminal), lr1.getItems(), lr1.getRules(), list(lr1.getTransitions()), lr1.getID(), ff,
+                      precedence, rule_precedence)
+    table, result['parsing_table_ms'] = timed(pt.generate_table)
+    result['table_entries'] = sum(len(row) for row in pt.table.values())
+    table_data, result['compress_ms'] = timed(pt.compress)
+    result['packed_entries'] = len(table_data[4])
+
+    result['total_ms'] = (result['first_follow_ms'] + result['itemsets_ms'] + result.get('lalr_ms', 0)
+                          + result['parsing_table_ms'] + result['compress_ms'])
+    result['peak_mb'] = peak_mb(build_parsing_table, non_terminal, terminal, rules, lalr, precedence, rule_precedence)
+    return result, table_data
+
+def parser_module(table_data, rules, compiled = False):
+    # the generated parser, run from the template with the table given
+    template = open(os.path.join(parser_dir, 'parser_template.py'), 'r').read()
+    if compiled:
+        main = template.index("if __name__ == '__main__':")
+        template = template[:main] + lr1_parser_generator.compiled_formatter(table_data, rules, None) + template[main:]
+    namespace = {'__name__': 'benchmark_parser', 'table_data': table_data, 'actions': [None] * len(table_data[1])}
+    exec(template, namespace)
+    return namespace
+
+def expression_input(levels, size):
+    # about size tokens of a valid expression of expression_grammar(levels)
+    random.seed(size)
+    tokens = ['t_id']
+    opened = 0
+    while len(tokens) + opened < size:
+        if random.random() < 0.1:
+            # parentheses around everything so far: the ( go in front at the end
+            tokens.append('t_rp')
+            opened += 1
+        tokens.append('t_op' + str(random.randrange(levels)))
+        tokens.append('t_id')
+    return [(token, 'x') for token in ['t_lp'] * opened + tokens]
+
+def parser_runtime(levels_list, sizes, repeat):
+    results = []
+    for levels in levels_list:
+        non_terminal, terminal, rules = expression_grammar(levels)
+        with contextlib.redirect_stdout(io.StringIO()):
+            table_data = build_parsing_table(non_terminal, terminal, rules, True)
+        parsers = [('table', parser_module(table_data, rules)), ('compiled', parser_module(table_data, rules, True))]
+        for size in sizes:
+            tokens = expression_input(levels, size)
+            for mode, parser in parsers:
+                parse_tokens = parser['parse_tokens']
+                ms = best_of(repeat, parse_tokens, tokens)
+                results.append({'mode': mode, 'levels': levels, 'tokens': len(tokens), 'ms': ms,
+                                'tokens_per_s': len(tokens) / ms * 1000})
+    return results
+
+
+def run(quick = False):
+    repeat = 1 if quick else 3
+    results = {'version': git_version(), 'python': platform.python_version(), 'quick': quick}
+
+    scanner_specs = [(name, scanner_generator.read_rules(os.path.join(scanner_dir, name)))
+                     for name in ('sampleRegex.txt', 'plus.txt', 'moodle.txt')]
+    for count in ([5, 20] if quick else [5, 20, 50, 100]):
+        scanner_specs.append((str(count) + ' keywords', keyword_rules(count)))
+    results['scanner_generation'] = [scanner_generation(name, regex_list)[0] for name, regex_list in scanner_specs]
+    results['scanner_runtime'] = scanner_runtime([1000, 10000] if quick else [1000, 10000, 100000, 1000000], repeat)
+
+    non_terminal, terminal, rules, actions, precedence, rule_precedence = \
+        lr1_parser_generator.read_grammar(os.path.join(parser_dir, 'sampleGrammar.txt'))
+    parser_specs = [('sampleGrammar.txt', non_terminal, terminal, rules, precedence, rule_precedence)]
+    for levels in ([1, 4] if quick else [1, 4, 8, 16]):
+        parser_specs.append((str(levels) + ' levels',) + expression_grammar(levels) + (None, None))
+    results['parser_generation'] = [parser_generation(*spec, lalr)[0] for spec in parser_specs for lalr in (False, True)]
+    results['parser_runtime'] = parser_runtime([1, 4] if quick else [1, 4, 16],
+                                               [100, 1000] if quick else [100, 1000, 10000, 100000], repeat)
+    return results
+
+
+if __name__ == '__main__':
+    options = [arg for arg in sys.argv[1:] if arg.startswith('--')]
+    results = run('--quick' in options)
+    output = json.dumps(results, indent = 2)
+    for option in options:
+        if option.startswith('--output='):
+            with open(option[len('--output='):], 'w') as out_file:
+                out_file.write(output + '\n')
+            break
+    else:
+        print(output)
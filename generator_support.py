@@ -0,0 +1,80 @@
+import hashlib
+import os
+
+# Shared by the scanner and the parser generator, which put this directory
+# on sys.path to import it.
+
+# Generated files kept by the hash of what they were made from: the rules
+# as read from the spec file, the options, the generator version and the
+# template. A spec that hasn't changed gets its file back without running
+# the generator. The files live in one directory that is kept under
+# max_bytes, the least recently used ones are removed first.
+class GenerationCache:
+    def __init__(self, directory, max_bytes = 32 << 20):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def key(self, *parts):
+        # repr() of lists, tuples, strings and numbers is stable across runs
+        return hashlib.sha256(repr(parts).encode('utf-8')).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key + '.py')
+
+    def get(self, key):
+        try:
+            with open(self.path(key), 'r') as cached:
+                text = cached.read()
+        except OSError:
+            return None
+        # mark it as used for the eviction order
+        os.utime(self.path(key))
+        return text
+
+    def put(self, key, text):
+        os.makedirs(self.directory, exist_ok = True)
+        temp = self.path(key) + '.tmp'
+        with open(temp, 'w') as out_file:
+            out_file.write(text)
+        os.replace(temp, self.path(key))
+        self.evict()
+
+    def evict(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.endswith('.py') and os.path.isfile(path):
+                status = os.stat(path)
+                entries.append((status.st_mtime, status.st_size, path))
+        total = sum(size for mtime, size, path in entries)
+        for mtime, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+
+# Write text to fileName unless it already holds exactly that, so the file
+# keeps its modification time and later build steps can skip it.
+def write_output(fileName, text):
+    try:
+        with open(fileName, 'r') as old_file:
+            if old_file.read() == text:
+                return False
+    except OSError:
+        pass
+    with open(fileName, 'w') as out_file:
+        out_file.write(text)
+    return True
+
+# Nested ifs over the sorted keys of cases, a list of (key, lines): each
+# key starts a range of the values of variable that goes on to the next
+# one, the range is halved until one is left. For the compiled scanners
+# and parsers.
+def dispatch(variable, cases, indent):
+    if len(cases) == 1:
+        return [indent + line for line in cases[0][1]]
+    middle = len(cases) // 2
+    return ([indent + 'if ' + variable + ' < ' + str(cases[middle][0]) + ':']
+            + dispatch(variable, cases[:middle], indent + '    ')
+            + [indent + 'else:']
+            + dispatch(variable, cases[middle:], indent + '    '))
@@ -0,0 +1,86 @@
+import contextlib
+import copy
+import io
+import os
+import random
+import sys
+import tempfile
+
+# python incremental_check.py [--trials=1200] [--seed=0]
+# Checks that incremental LR(1) regeneration (generateParsingTable with a
+# state_file) gives the same table and FIRST/FOLLOW sets as a build from
+# scratch. Each trial is a random grammar taken through 6 edits: rules
+# inserted, deleted, changed, swapped and duplicated, and changes to the
+# nonterminal line, in LR(1) and LALR mode at random. Exits with status 1
+# on the first difference.
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(here, 'LR1 Parser Generator'))
+
+from lr1_itemset_table_gen import MainLR1gen
+
+non_terminals = ["S'", 'A', 'B', 'C', 'D', 'E']
+terminals = ['a', 'b', 'c', 'd']
+
+def random_rule():
+    lhs = random.choice(non_terminals[1:])
+    return [lhs] + random.choices(non_terminals[1:] + terminals + terminals, k = random.choice([0, 1, 1, 2, 2, 3, 3, 4]))
+
+def build(non_terminal, rules, lalr, state_file):
+    # (table data, FIRST and FOLLOW as printed)
+    with contextlib.redirect_stdout(io.StringIO()) as out:
+        data = MainLR1gen().generateParsingTable(list(non_terminal), list(terminals), copy.deepcopy(rules), lalr,
+                                                 state_file)
+    return data, out.getvalue().splitlines()[:2]
+
+def edit(non_terminal, rules):
+    kind = random.random()
+    if kind < 0.3 and len(rules) > 2:
+        del rules[random.randrange(1, len(rules))]
+    elif kind < 0.6:
+        rules.insert(random.randrange(1, len(rules) + 1), random_rule())
+    elif kind < 0.8:
+        rules[random.randrange(1, len(rules))] = random_rule()
+    elif kind < 0.9:
+        i, j = random.randrange(1, len(rules)), random.randrange(1, len(rules))
+        rules[i], rules[j] = rules[j], rules[i]
+    elif kind < 0.95:
+        rules.append(list(random.choice(rules[1:])))
+    else:
+        # the nonterminal line: reordered, one taken out or one added
+        non_terminal = [non_terminal[0]] + random.sample(non_terminal[1:], len(non_terminal) - 1)
+        if random.random() < 0.5 and len(non_terminal) > 2:
+            non_terminal.pop()
+        elif 'F' not in non_terminal:
+            non_terminal.append('F')
+    return non_terminal
+
+def check(trials, seed):
+    random.seed(seed)
+    with tempfile.TemporaryDirectory() as directory:
+        state_file = os.path.join(directory, 'grammar.lr1state')
+        for trial in range(trials):
+            if os.path.exists(state_file):
+                os.remove(state_file)
+            non_terminal = list(non_terminals)
+            rules = [["S'", 'A']] + [random_rule() for i in range(random.randint(3, 9))]
+            for step in range(6):
+                lalr = random.random() < 0.5
+                if build(non_terminal, rules, lalr, state_file) != build(non_terminal, rules, lalr, None):
+                    print('Different from a full build: trial ' + str(trial) + ', edit ' + str(step) + ', lalr '
+                          + str(lalr) + ', nonterminals ' + str(non_terminal) + ', rules ' + str(rules))
+                    return False
+                non_terminal = edit(non_terminal, rules)
+    print(str(trials) + ' grammars, 6 edits each: same as full builds')
+    return True
+
+
+if __name__ == '__main__':
+    trials = 1200
+    seed = 0
+    for option in sys.argv[1:]:
+        if option.startswith('--trials='):
+            trials = int(option[len('--trials='):])
+        if option.startswith('--seed='):
+            seed = int(option[len('--seed='):])
+    sys.exit(0 if check(trials, seed) else 1)
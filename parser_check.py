@@ -0,0 +1,162 @@
+import contextlib
+import copy
+import io
+import os
+import random
+import sys
+
+# python parser_check.py [--trials=300] [--seed=0]
+# Checks the compiled parser (lr1_parser_generator.py --compiled) against
+# the table driven one on random grammars, some with actions and with
+# %left, %right, %nonassoc and %prec, in LR(1) and LALR mode at random.
+# Each grammar parses 100 token strings, derived from the grammar or
+# random with unknown tokens among them, with the actions, without them and with a reduce function. Both parsers
+# must give the same value, or the same ParseError at the same token.
+# Exits with status 1 on the first difference.
+
+here = os.path.dirname(os.path.abspath(__file__))
+parser_dir = os.path.join(here, 'LR1 Parser Generator')
+sys.path.insert(0, parser_dir)
+
+from lr1_itemset_table_gen import MainLR1gen
+import lr1_parser_generator
+
+non_terminals = ["S'", 'A', 'B', 'C', 'D']
+terminals = ['a', 'b', 'c', 'd']
+
+def random_rule():
+    lhs = random.choice(non_terminals[1:])
+    return [lhs] + random.choices(non_terminals[1:] + terminals + terminals, k = random.choice([0, 1, 1, 2, 2, 3, 3]))
+
+def random_grammar():
+    rules = [["S'", 'A']] + [random_rule() for i in range(random.randint(3, 8))]
+    # the values of the right hand side, with the number of the rule
+    actions = [None] + [None if random.random() < 0.5 else
+                        '(' + str(i) + ', [' + ', '.join('$' + str(k) for k in range(1, len(rule))) + '])'
+                        for i, rule in enumerate(rules[1:], 1)]
+    precedence = dict()
+    if random.random() < 0.5:
+        for level, symbol in enumerate(random.sample(terminals, random.randint(1, 4)), 1):
+            precedence[symbol] = (random.randint(1, level), random.choice(['left', 'right', 'nonassoc']))
+            # an operator rule, for conflicts that precedence settles
+            if random.random() < 0.5:
+                rules.append(['A', 'A', symbol, 'A'])
+                actions.append('(' + str(len(rules) - 1) + ', [$1, $2, $3])')
+    rule_precedence = [None] * len(rules)
+    for i in range(1, len(rules)):
+        if len(precedence) > 0 and random.random() < 0.1:
+            rule_precedence[i] = random.choice(list(precedence))
+    return rules, actions, precedence, rule_precedence
+
+# whether some nonterminal derives itself, X =>+ X
+def cyclic(rules):
+    nullable = set()
+    changed = True
+    while changed:
+        changed = False
+        for rule in rules:
+            if rule[0] not in nullable and all(symbol in nullable for symbol in rule[1:]):
+                nullable.add(rule[0])
+                changed = True
+    # X -> Y when X derives Y alone
+    reaches = {symbol: set() for symbol in non_terminals}
+    for rule in rules:
+        for i, symbol in enumerate(rule[1:], 1):
+            if symbol in reaches and all(other in nullable for other in rule[1:i] + rule[i + 1:]):
+                reaches[rule[0]].add(symbol)
+    for symbol in non_terminals:
+        seen = set()
+        working_set = list(reaches[symbol])
+        while len(working_set) > 0:
+            other = working_set.pop()
+            if other == symbol:
+                return True
+            if other not in seen:
+                seen.add(other)
+                working_set.extend(reaches[other])
+    return False
+
+# tokens of a random derivation from symbol, None if it goes too deep
+def derive(rules, symbol, depth = 0):
+    if symbol not in non_terminals:
+        return [symbol]
+    if depth > 10:
+        return None
+    choices = [rule for rule in rules if rule[0] == symbol]
+    if len(choices) == 0:
+        return None
+    tokens = []
+    for rhs_symbol in random.choice(choices)[1:]:
+        more = derive(rules, rhs_symbol, depth + 1)
+        if more is None:
+            return None
+        tokens = tokens + more
+    return tokens
+
+def parser_module(table_data, rules, actions, compiled):
+    # the generated parser, run from the template with the table given
+    template = open(os.path.join(parser_dir, 'parser_template.py'), 'r').read()
+    if compiled:
+        main = template.index("if __name__ == '__main__':")
+        template = template[:main] + lr1_parser_generator.compiled_formatter(table_data, rules, actions) + template[main:]
+    namespace = {'__name__': 'parser_check', 'table_data': table_data}
+    exec(lr1_parser_generator.actions_formatter(rules, actions), namespace)
+    exec(template, namespace)
+    return namespace
+
+def result(parser, tokens, **options):
+    try:
+        return ('accepted', parser['parse_tokens']([(token, token.upper()) for token in tokens], **options))
+    except parser['ParseError'] as error:
+        return ('rejected', str(error), error.position, error.token)
+
+def check(trials, seed):
+    random.seed(seed)
+    accepted = 0
+    for trial in range(trials):
+        # cycles and reduce/reduce conflicts are left out, such a parser
+        # can go on reducing forever on some inputs
+        while True:
+            rules, actions, precedence, rule_precedence = random_grammar()
+            if cyclic(rules):
+                continue
+            lalr = random.random() < 0.5
+            generator = MainLR1gen()
+            with contextlib.redirect_stdout(io.StringIO()):
+                generator.generateParsingTable(list(non_terminals), list(terminals), copy.deepcopy(rules), lalr, None,
+                                               precedence, rule_precedence)
+            if all(shift is not None for state, lookahead, shift, productions in generator.conflicts):
+                break
+        table = parser_module(generator.table_data, rules, actions, False)
+        compiled = parser_module(generator.table_data, rules, actions, True)
+
+        for i in range(100):
+            # half of them made from the grammar, most of those are accepted
+            tokens = derive(rules, 'A') if i % 2 == 0 else None
+            if tokens is None:
+                tokens = random.choices(terminals + ['e'] if i % 4 == 1 else terminals, k = random.randint(0, 8))
+            for options in ({}, {'run_actions': False}, {'reduce': lambda lhs, rhs, values: (lhs, len(values))}):
+                expected = result(table, tokens, **options)
+                found = result(compiled, tokens, **options)
+                if found != expected:
+                    print('Different from the table parser: trial ' + str(trial) + ', lalr ' + str(lalr) + ', rules '
+                          + str(rules) + ', actions ' + str(actions) + ', precedence ' + str(precedence) + ' '
+                          + str(rule_precedence) + ', tokens ' + str(tokens) + ', options ' + str(options))
+                    print('  table: ' + str(expected))
+                    print('  compiled: ' + str(found))
+                    return False
+            accepted += expected[0] == 'accepted'
+    print(str(trials) + ' grammars, 100 token strings each (' + str(accepted)
+          + ' accepted): same results and errors as the table parser')
+    return True
+
+
+if __name__ == '__main__':
+    trials = 300
+    seed = 0
+    for option in sys.argv[1:]:
+        if option.startswith('--trials='):
+            trials = int(option[len('--trials='):])
+        if option.startswith('--seed='):
+            seed = int(option[len('--seed='):])
+    sys.exit(0 if check(trials, seed) else 1)
@@ -0,0 +1,90 @@
+import io
+import os
+import random
+import sys
+
+# python scanner_check.py [--trials=300] [--seed=0]
+# Checks the other ways of scanning against the table driven scan() on
+# random rule sets: the compiled scan(), with and without --re, the lazy
+# DFA with a cache of 1, 2 and 1000 states, and scan_stream() over chunks
+# of a few characters. Some rule sets get a rule that reads any character,
+# like x (.|\n)+. Each rule set is scanned on 200 random strings, ending
+# and not ending the input. Exits with status 1 on the first difference.
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(here, 'Scanner Generator'))
+
+import contextlib
+import regexParser as rp
+import scanner_template as st
+import scanner_generator
+
+atoms = ['a', 'b', 'c', '1', '"', '\\n', '\\ ', '\\.', '.', '[ab]', '[^a]', '[a-c1]', '[^"\\n]', '\\d', '\\s', '\\w']
+read_any = ['(.|\\n)+', '(a|[^a])+', '[^b]*b', '(.|\\n)']
+alphabet = 'abc1" \n.xé'
+
+def random_regex(depth):
+    kind = random.random()
+    if depth == 0 or kind < 0.35:
+        return random.choice(atoms)
+    if kind < 0.6:
+        return ''.join(random_regex(depth - 1) for i in range(random.randint(2, 3)))
+    if kind < 0.75:
+        return '(' + random_regex(depth - 1) + '|' + random_regex(depth - 1) + ')'
+    return '(' + random_regex(depth - 1) + ')' + random.choice('*+?')
+
+def random_rules():
+    # a few names are given to more than one rule
+    rules = [('t_' + str(random.randrange(4)), random_regex(3)) for i in range(random.randint(1, 6))]
+    if random.random() < 0.2:
+        rules.insert(random.randrange(len(rules) + 1), ('t_any', random.choice(read_any)))
+    return rules
+
+def compiled_scan(table, use_re):
+    # scan() of the compiled mode, run in a copy of the template module
+    namespace = dict(vars(st))
+    exec(scanner_generator.compiled_formatter(table, use_re), namespace)
+    return namespace['scan']
+
+def check(trials, seed):
+    random.seed(seed)
+    for trial in range(trials):
+        rules = random_rules()
+        with contextlib.redirect_stdout(io.StringIO()):
+            header, table = scanner_generator.regex_formatter(rules)
+        nfa_data = rp.union(rules)
+        scanners = [('compiled', compiled_scan(table, False), table), ('compiled --re', compiled_scan(table, True), table)]
+        for max_states in (1, 2, 1000):
+            lazy = st.LazyDFA(st.NFA(*nfa_data[:6]), nfa_data[6], nfa_data[7], max_states)
+            scanners.append(('lazy ' + str(max_states), st.scan, lazy))
+
+        for i in range(200):
+            text = ''.join(random.choice(alphabet) for j in range(random.randint(0, 30)))
+            final = random.random() < 0.8
+            expected = list(st.scan(text, table, 0, final))
+            results = [(mode, list(scan(text, scan_table, 0, final))) for mode, scan, scan_table in scanners]
+            if final:
+                chunk_size = random.randint(1, 5)
+                for mode, scan_table in (('stream', table), ('lazy stream', scanners[-1][2])):
+                    tokens = st.scan_stream(io.StringIO(text), scan_table, chunk_size)
+                    results.append((mode, [token[:4] for token in tokens]))
+            for mode, tokens in results:
+                if tokens != expected:
+                    print('Different from scan(): ' + mode + ', rules ' + str(rules) + ', input ' + repr(text)
+                          + ', final ' + str(final))
+                    print('  scan(): ' + str(expected))
+                    print('  ' + mode + ': ' + str(tokens))
+                    return False
+    print(str(trials) + ' rule sets, 200 inputs each: same as scan()')
+    return True
+
+
+if __name__ == '__main__':
+    trials = 300
+    seed = 0
+    for option in sys.argv[1:]:
+        if option.startswith('--trials='):
+            trials = int(option[len('--trials='):])
+        if option.startswith('--seed='):
+            seed = int(option[len('--seed='):])
+    sys.exit(0 if check(trials, seed) else 1)